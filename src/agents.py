@@ -1,23 +1,48 @@
 import math
 import random
 import pygame
-from typing import List, Union
+from typing import Dict, List, Optional, Union
 
+import bitboard
 from constants import NO_MOVE, QUIT_GAME
-from model import Coordinate, State
+from features import POSITIONAL_WEIGHTS, Features, extract, positional_sum, weight_masks
+from model import Coordinate, SearchState, State
+from renderer import Renderer
 
 
 # An interface for Reversi AI agents
 # All implementing evaluation functions only evaluate for black
 class Agent:
+    # Whether evaluate_batch is much cheaper than calling evaluate on each state, so searches should
+    # evaluate all successors of a node at once rather than one at a time
+    batch_evaluation = False
+
+    # Whether the agent keeps searching on its opponent's time, which charges the opponent's clock for it when the
+    # opponent is another agent in the same process
+    ponders = False
+
     # Returns the best action for this state based on the agent's evaluation function 
-    def get_action(self, state: State) -> Coordinate:
+    # When the game is played on a clock, deadline is the time.perf_counter() time by which the move is due;
+    # agents that search for a fixed amount of work ignore it
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
         best_actions = []
+        actions = state.valid_moves()
+
+        if self.batch_evaluation:
+            # All successors are evaluated together so batched evaluators make a single call per move
+            utilities = self.evaluate_batch([state.place_disk(action) for action in actions])
+        else:
+            # Moves are made and undone in place on a private copy of the state
+            search_state = SearchState(state)
+            utilities = []
+            for action in actions:
+                search_state.make_move(action)
+                utilities.append(self.evaluate(search_state))
+                search_state.undo_move()
 
         if state.turn() == State.BLACK:
             max_utility = -math.inf
-            for action in state.valid_moves():
-                utility = self.evaluate(state.place_disk(action))
+            for action, utility in zip(actions, utilities):
                 if utility == max_utility:
                     best_actions.append(action)
                 if utility > max_utility:
@@ -25,8 +50,7 @@ class Agent:
                     best_actions = [action]
         else:
             min_utility = math.inf
-            for action in state.valid_moves():
-                utility = self.evaluate(state.place_disk(action))
+            for action, utility in zip(actions, utilities):
                 if utility == min_utility:
                     best_actions.append(action)
                 if utility < min_utility:
@@ -51,18 +75,50 @@ class Agent:
     def evaluate(self, state: State) -> int:
         return 0
 
+    # Evaluates the state given its features (see features.py), which agents that only need the features
+    # can use to skip walking the board
+    def evaluate_features(self, state: State, features: Features) -> int:
+        return self.evaluate(state)
+
+    # Evaluates several states at once, returning the utilities in the same order
+    def evaluate_batch(self, states: List[State]) -> List[int]:
+        return [self.evaluate(state) for state in states]
+
     # Breaks ties between actions that lead to states with the same utility
     def tiebreaker(self, actions: List[Coordinate]) -> Coordinate:
         return random.choice(actions)
 
+    # Returns counters describing the agent's work so far, such as opening book hits
+    def statistics(self) -> Dict[str, float]:
+        return {}
+
+    # Starts recording statistics about the search behind each move (see instrumentation.py)
+    # Agents that do not search ignore it
+    def instrument(self) -> None:
+        pass
+
+    # Returns the statistics of each move chosen since the last call, once the agent is instrumented
+    def take_move_records(self) -> List[Dict[str, float]]:
+        return []
+
+    # Stops any work the agent does between its moves, such as pondering, once the game is over or when its move
+    # was chosen without it
+    def stop_thinking(self) -> None:
+        pass
+
+    # Releases any resources held by the agent, such as worker processes
+    def close(self) -> None:
+        pass
+
     def __str__(self) -> str:
         return "Random"
 
 
 # Agent that gets a move from the user
 class ManualAgent(Agent):
-    def get_action(self, state: State) -> Union[Coordinate, str]:
-        if state.window is not None:
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Union[Coordinate, str]:
+        # In the GUI, moves come from mouse clicks on the window
+        if pygame.display.get_surface() is not None:
             events = pygame.event.get()
             if len(events) == 0:
                 return NO_MOVE
@@ -73,7 +129,7 @@ class ManualAgent(Agent):
 
             if event.type == pygame.MOUSEBUTTONDOWN:
                 position = pygame.mouse.get_pos()
-                return State.get_coordinate_from_position(position)
+                return Renderer.get_coordinate_from_position(position)
 
             return NO_MOVE
 
@@ -101,6 +157,9 @@ class MostDisksAgent(Agent):
     def evaluate(self, state: State) -> int:
         return state.black_disks() - state.white_disks()
 
+    def evaluate_features(self, state: State, features: Features) -> int:
+        return features.black_disks - features.white_disks
+
     def __str__(self) -> str:
         return "Most Disks"
 
@@ -113,6 +172,9 @@ class MobilityAgent(Agent):
         if state.turn() == State.WHITE:
             return -len(state.valid_moves())
 
+    def evaluate_features(self, state: State, features: Features) -> int:
+        return features.black_mobility if features.black_to_move else -features.white_mobility
+
     def __str__(self) -> str:
         return "Mobility"
 
@@ -120,30 +182,21 @@ class MobilityAgent(Agent):
 # Agent that assigns weights to each of the positions on the board
 class PositionalAgent(Agent):
     # Default position weights grid
-    DEFAULT = [[100, -25,  50, 10, 10,  50, -25, 100],
-               [-25, -50, -10, -5, -5, -10, -50, -25],
-               [ 50, -10,   5,  1,  1,   5, -10,  50],
-               [ 10,  -5,   1, -1, -1,   1,  -5,  10],
-               [ 10,  -5,   1, -1, -1,   1,  -5,  10],
-               [ 50, -10,   5,  1,  1,   5, -10,  50],
-               [-25, -50, -10, -5, -5, -10, -50, -25],
-               [100, -25,  50, 10, 10,  50, -25, 100]]
+    DEFAULT = POSITIONAL_WEIGHTS
 
     # Creates a new positional agent with a grid of weights
     def __init__(self, weights: List[List[int]] = DEFAULT):
         self.weights = weights
+        # The cells with each weight as a bitboard
+        self.masks = weight_masks(weights)
 
     def evaluate(self, state: State) -> int:
-        utility = 0
+        return positional_sum(state.black, state.white, self.masks)
 
-        for row in range(State.SIZE):
-            for col in range(State.SIZE):
-                if state.board[row][col] == State.BLACK:
-                    utility += self.weights[row][col]
-                if state.board[row][col] == State.WHITE:
-                    utility -= self.weights[row][col]
-
-        return utility
+    def evaluate_features(self, state: State, features: Features) -> int:
+        if self.weights == PositionalAgent.DEFAULT:
+            return features.positional
+        return self.evaluate(state)
 
     def __str__(self) -> str:
         return "Positional"
@@ -156,11 +209,20 @@ class CompositeAgent(Agent):
         self.agents = agents
     
     def evaluate(self, state: State) -> int:
+        return self.combine(state, self.evaluate_components(state))
+
+    # Returns each agent's utility for the state, before weighting, from a single feature pass
+    def evaluate_components(self, state: State) -> List[int]:
+        state_features = extract(state)
+        return [agent.evaluate_features(state, state_features) for agent in self.agents]
+
+    # Returns the weighted sum of the component utilities of the state
+    def combine(self, state: State, components: List[int]) -> int:
         weights = self.get_weights(state.black_disks() + state.white_disks())
 
         utility = 0
         for i in range(len(self.agents)):
-            utility += weights[i] * self.agents[i].evaluate(state)
+            utility += weights[i] * components[i]
 
         return utility
     
@@ -185,46 +247,13 @@ class SuperiorAgent(CompositeAgent):
 
 
 # Agent that values moves that result in more disks that cannot be flipped for the rest of the game
-# Doesn't work, but does something similar
 class StabilityAgent(Agent):
     def evaluate(self, state: State) -> int:
-        return self.evaluate_corner(state, True, True) + self.evaluate_corner(state, True, False) + self.evaluate_corner(state, False, True) + self.evaluate_corner(state, False, False)
-    
-    def evaluate_corner(self, state: State, upper: bool, left: bool) -> int:
-        return self.evaluate_corner_color(state, upper, left, True) + self.evaluate_corner_color(state, upper, left, False)
-        
-    def evaluate_corner_color(self, state: State, upper: bool, left: bool, black: bool) -> int:
-        stable = 0
-        row = 0 if upper else State.SIZE - 1
-        col = 0 if left else State.SIZE - 1
-        if (black and state.board[row][col] == State.BLACK) or (not black and state.board[row][col] == State.WHITE):
-            # Corner disk is stable
-            stable = stable + 1 if black else stable - 1
-            # Traverse through row until you find a non-stable disk
-            col = col + 1 if left else col - 1
-            while (black and state.board[row][col] == State.BLACK) or (not black and state.board[row][col] == State.WHITE):
-                stable = stable + 1 if black else stable - 1
-                col = col + 1 if left else col - 1
-                if (left and col == State.SIZE - 2) or (not left and col == 1):
-                        break
-            scope = col - 1 if left else col + 1
-            # Traverse through subsequent rows until you find a row where the first disk is non-stable
-            row = row + 1 if upper else row - 1
-            col = 0 if left else State.SIZE - 1
-            while (black and state.board[row][col] == State.BLACK) or (not black and state.board[row][col] == State.WHITE):
-                stable = stable + 1 if black else stable - 1
-                col = col + 1 if left else col - 1
-                while ((black and state.board[row][col] == State.BLACK) or (not black and state.board[row][col] == State.WHITE)) and ((left and col <= scope) or (not left and col >= scope)):
-                    stable = stable + 1 if black else stable - 1
-                    col = col + 1 if left else col - 1
-                    if (left and col == State.SIZE - 2) or (not left and col == 1):
-                        break
-                scope = col - 1 if left else col + 1
-                row = row + 1 if upper else row - 1
-                col = 0 if left else State.SIZE - 1
-                if (upper and row == State.SIZE - 2) or (not upper and row == 1):
-                        break
-        return stable
+        black_stable, white_stable = bitboard.get_stable_disks(state.black, state.white)
+        return black_stable.bit_count() - white_stable.bit_count()
+
+    def evaluate_features(self, state: State, features: Features) -> int:
+        return features.black_stable - features.white_stable
 
     def __str__(self) -> str:
         return "Stability"
@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+import sys
+import time
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from agents import MobilityAgent, MostDisksAgent, PositionalAgent, RadiusAgent, StabilityAgent, SuperiorAgent
+from minimax import MinimaxAgent
+from model import SearchState, State
+
+# Speed benchmarks of the move generator, the evaluation functions and the minimax search, compared against a
+# baseline of earlier results so that changes that slow the engine down are caught
+# Every result is a cost (seconds, or positions counted or searched), so lower is better
+# Counts are the same on every machine and are always compared; timings are not, so they are only compared on
+# request, against a baseline recorded on the same machine
+
+# Number of leaf positions at each depth from the initial position, counting a pass as a ply
+PERFT_COUNTS = {1: 4, 2: 12, 3: 56, 4: 244, 5: 1396, 6: 8200, 7: 55092, 8: 390216, 9: 3005288, 10: 24571284,
+                11: 212258800}
+
+# Midgame positions searched by the search benchmark, as the moves played from the initial position
+# Each move is a column letter followed by a row number
+MIDGAME_POSITIONS = [
+    'd6e6f6c6f4d7c7f5d8d3b6g3c3b7e3f3h3e7g4f2',
+    'c5c4f3b6b3b4d3e3b5f6f5d2c2f4g6h6d1c1g7f2h7h8',
+    'e3f5c6e2f3g4g5e6f6f7g2c4g3f4f8h3d6g8e1d3c5g1b3f1',
+    'd6e6f5c6f4f3e7c4c3f7d3g4g7e2e3g8h4f6g6f2d1h3g2e1b5b2',
+    'f4d3c4f5f6e6c2g4f7d7g6c3c8c5b5d2d1b4a5c6e3d6b7a6b3g5e7h7',
+    'f4f3f2d3c3g2e3d2h2b2a1b3c1f1b4h3g1f5d6c4h1g3g6d7e6e1h4a5d1a3',
+    'f4f3c5g4e3d6g3e2h4d3c6b5c7f5a4h5d2e7h6c2g5g6c4a5f7b7c1g7c3b1e6h3',
+    'f4f5c6c3g6c5b5f6e6d6c4c7b4g7b6a7d2b2c8a3b7a6d3a4a5c2f7d1e7f8a1g3h7g8',
+]
+
+# Evaluation functions whose throughput is measured
+EVALUATORS = {
+    'most_disks': MostDisksAgent,
+    'mobility': MobilityAgent,
+    'positional': PositionalAgent,
+    'stability': StabilityAgent,
+    'radius': RadiusAgent,
+    'superior': SuperiorAgent,
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models', 'benchmark_baseline.json')
+
+# Timings may be this much higher than the baseline, as a fraction of it, before they count as regressions
+DEFAULT_THRESHOLD = 0.25
+
+
+# Returns the number of leaf positions depth plies from the state, counting a pass as a ply and a finished game
+# as a single leaf
+# The moves of the last ply are counted rather than played
+def perft(state: SearchState, depth: int) -> int:
+    if depth == 0:
+        return 1
+
+    actions = state.valid_moves()
+    if not actions:
+        return 1
+
+    if state.passed:
+        depth -= 1
+        if depth == 0:
+            return 1
+
+    if depth == 1:
+        return len(actions)
+
+    leaves = 0
+    for action in actions:
+        state.make_move(action)
+        leaves += perft(state, depth - 1)
+        state.undo_move()
+    return leaves
+
+
+# Returns the state after playing the moves, written as a column letter followed by a row number
+def play_moves(moves: str) -> State:
+    state = State()
+    for index in range(0, len(moves), 2):
+        state = state.place_disk((int(moves[index + 1]) - 1, ord(moves[index]) - ord('a')))
+    return state
+
+
+# Returns the time of a single call of the function, taking the best of a few timing runs of at least 0.2 seconds
+def time_call(function: Callable[[], object], repeat: int = 5) -> float:
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+# Counts and times counting the leaves of the initial position to the given depth
+# Raises an error if the count differs from the known one
+def benchmark_perft(depth: int) -> Dict[str, float]:
+    leaves = perft(SearchState(State()), depth)
+    if depth in PERFT_COUNTS and leaves != PERFT_COUNTS[depth]:
+        raise ValueError(f"perft({depth}) counted {leaves} leaves instead of {PERFT_COUNTS[depth]}")
+
+    return {f'perft_{depth}_leaves': leaves,
+            f'perft_{depth}_time': time_call(lambda: perft(SearchState(State()), depth), repeat=3)}
+
+
+# Times generating the moves of a position, playing a move, and making and undoing a move in place, on average
+# over the midgame positions
+def benchmark_moves(states: List[State]) -> Dict[str, float]:
+    # Move generation runs on copies whose moves are cleared before each run; the copies start with the player to
+    # move already resolved so that clearing the moves never makes them pass again
+    copies = [State.from_bitboards(state.black, state.white, turn=state.turn()) for state in states]
+    actions = [(state, state.valid_moves()[0]) for state in states]
+    search_actions = [(SearchState(state), action) for state, action in actions]
+
+    def generate_moves():
+        for state in copies:
+            state.moves = state.move_list = None
+            state.valid_moves()
+
+    def place_disks():
+        for state, action in actions:
+            state.place_disk(action)
+
+    def make_and_undo_moves():
+        for state, action in search_actions:
+            state.make_move(action)
+            state.undo_move()
+
+    return {'valid_moves_time': time_call(generate_moves) / len(states),
+            'place_disk_time': time_call(place_disks) / len(states),
+            'make_undo_move_time': time_call(make_and_undo_moves) / len(states)}
+
+
+# Times the evaluation function of every agent on average over the midgame positions
+def benchmark_evaluation(states: List[State]) -> Dict[str, float]:
+    results = {}
+    for name, agent_class in EVALUATORS.items():
+        agent = agent_class()
+        results[f'evaluate_{name}_time'] = time_call(lambda: [agent.evaluate(state) for state in states]) / len(states)
+    return results
+
+
+# Searches every midgame position to the given depth with a fresh agent and returns the total time and nodes
+# The transposition table is left out so that the results do not depend on its size
+def benchmark_search(states: List[State], depth: int) -> Dict[str, float]:
+    total_time, total_nodes = 0.0, 0
+    for state in states:
+        agent = MinimaxAgent(SuperiorAgent(), depth, 0)
+        agent.get_action(state)
+        total_nodes += agent.nodes
+        total_time += time_call(lambda: MinimaxAgent(SuperiorAgent(), depth, 0).get_action(state), repeat=3)
+
+    return {f'search_{depth}_time': total_time, f'search_{depth}_nodes': total_nodes}
+
+
+# Runs every benchmark and returns the results by name
+def run_benchmarks(perft_depth: int, search_depth: int, progress: bool = False) -> Dict[str, float]:
+    states = [play_moves(moves) for moves in MIDGAME_POSITIONS]
+    results = {}
+
+    for name, benchmark in [('perft', lambda: benchmark_perft(perft_depth)),
+                            ('moves', lambda: benchmark_moves(states)),
+                            ('evaluation', lambda: benchmark_evaluation(states)),
+                            ('search', lambda: benchmark_search(states, search_depth))]:
+        if progress:
+            print(f'Running the {name} benchmark')
+        results.update(benchmark())
+
+    return results
+
+
+def is_timing(name: str) -> bool:
+    return name.endswith('_time')
+
+
+# Returns the results that are higher than the baseline, as (name, result, baseline)
+# Counts regress when they are higher at all; timings are only compared when asked, and regress when they are
+# higher by more than the threshold
+# Results missing from the baseline are not compared
+def find_regressions(results: Dict[str, float], baseline: Dict[str, float], threshold: float = DEFAULT_THRESHOLD,
+                     timings: bool = False) -> List[Tuple[str, float, float]]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        if is_timing(name):
+            if timings and result > baseline[name] * (1 + threshold):
+                regressions.append((name, result, baseline[name]))
+        elif result > baseline[name]:
+            regressions.append((name, result, baseline[name]))
+    return regressions
+
+
+def format_result(name: str, value: float) -> str:
+    if is_timing(name):
+        return f'{value * 1000:.3f} ms' if value >= 1e-3 else f'{value * 1e6:.2f} us'
+    return str(value)
+
+
+def load_baseline(path: str) -> Dict[str, float]:
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def save_baseline(path: str, results: Dict[str, float], perft_depth: int, search_depth: int) -> None:
+    with open(path, 'w') as file:
+        json.dump({'perft_depth': perft_depth, 'search_depth': search_depth, 'results': results}, file, indent=1)
+
+
+# Runs the benchmarks and compares them against the baseline, exiting with status 1 on a regression
+# The baseline only keeps timings when it is recorded with --update --timings, which should be done on the machine
+# it is checked on
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog = 'Reversi AI benchmarks')
+    parser.add_argument('-b', '--baseline', default = BASELINE_PATH)
+    parser.add_argument('-t', '--threshold', type = float, default = DEFAULT_THRESHOLD)
+    parser.add_argument('--perft-depth', type = int, default = 8)
+    parser.add_argument('--search-depth', type = int, default = 4)
+    parser.add_argument('-u', '--update', action = 'store_true')
+    parser.add_argument('--timings', action = 'store_true')
+
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmarks(args.perft_depth, args.search_depth, progress = True)
+    except ValueError as error:
+        print(f'Move generator error: {error}')
+        sys.exit(1)
+
+    baseline = {} if args.update or not os.path.exists(args.baseline) else load_baseline(args.baseline)
+    for name, value in results.items():
+        comparison = ''
+        if name in baseline and baseline[name] > 0:
+            comparison = f' ({(value / baseline[name] - 1) * 100:+.1f}% against the baseline)'
+        print(f'{name}: {format_result(name, value)}{comparison}')
+
+    if args.update:
+        if not args.timings:
+            results = {name: value for name, value in results.items() if not is_timing(name)}
+        save_baseline(args.baseline, results, args.perft_depth, args.search_depth)
+        print(f'Wrote the baseline to {args.baseline}')
+        sys.exit(0)
+
+    if args.timings and not any(is_timing(name) for name in baseline):
+        print('\nThe baseline has no timings; record them on this machine with --update --timings')
+
+    regressions = find_regressions(results, baseline, args.threshold, args.timings)
+    if regressions:
+        print(f'\n{len(regressions)} results are above the baseline:')
+        for name, result, baseline_result in regressions:
+            print(f'{name}: {format_result(name, result)}, baseline {format_result(name, baseline_result)}')
+        sys.exit(1)
+
+    print('\nNo regressions')
@@ -0,0 +1,251 @@
+from typing import List, Tuple
+
+# Bitboard helpers for 8x8 Reversi boards
+# Bit i of a bitboard corresponds to the cell at row i // 8, column i % 8
+
+# A 64-bit integer with every cell set
+FULL = 0xFFFFFFFFFFFFFFFF
+
+# Every cell except those in the leftmost and rightmost columns
+INNER_COLUMNS = 0x7E7E7E7E7E7E7E7E
+
+# Shift amounts paired with the mask of opponent disks that may be flanked in that direction
+# Horizontal and diagonal lines can never flank a disk on the left or right edge
+# Each direction is used both as a left shift and as a right shift
+SHIFTS = ((1, INNER_COLUMNS), (7, INNER_COLUMNS), (8, FULL), (9, INNER_COLUMNS))
+
+
+# Converts a list-of-lists board into black and white bitboards
+def from_board(board: List[List[int]], black: int = 1, white: int = 2) -> Tuple[int, int]:
+    black_bits, white_bits = 0, 0
+
+    for row_index, row in enumerate(board):
+        for col_index, cell in enumerate(row):
+            if cell == black:
+                black_bits |= 1 << (row_index * 8 + col_index)
+            elif cell == white:
+                white_bits |= 1 << (row_index * 8 + col_index)
+
+    return black_bits, white_bits
+
+
+# Converts black and white bitboards into a list-of-lists board
+def to_board(black_bits: int, white_bits: int, black: int = 1, white: int = 2) -> List[List[int]]:
+    board = [[0] * 8 for _ in range(8)]
+
+    for index in iterate_bits(black_bits):
+        board[index >> 3][index & 7] = black
+    for index in iterate_bits(white_bits):
+        board[index >> 3][index & 7] = white
+
+    return board
+
+
+# Returns the indices of the set bits in ascending order
+def iterate_bits(bits: int) -> List[int]:
+    indices = []
+
+    while bits:
+        lowest = bits & -bits
+        indices.append(lowest.bit_length() - 1)
+        bits ^= lowest
+
+    return indices
+
+
+# Returns the bit for the given row and column
+def square(row: int, col: int) -> int:
+    return 1 << (row * 8 + col)
+
+
+# Returns the set of empty cells where the player can move, computed with Kogge-Stone occluded fills
+def get_moves(player: int, opponent: int) -> int:
+    empty = ~(player | opponent) & FULL
+    moves = 0
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        gen = player
+        gen |= pro & (gen << shift)
+        pro &= pro << shift
+        gen |= pro & (gen << 2 * shift)
+        pro &= pro << 2 * shift
+        gen |= pro & (gen << 4 * shift)
+        moves |= ((gen ^ player) << shift) & empty
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        gen = player
+        gen |= pro & (gen >> shift)
+        pro &= pro >> shift
+        gen |= pro & (gen >> 2 * shift)
+        pro &= pro >> 2 * shift
+        gen |= pro & (gen >> 4 * shift)
+        moves |= ((gen ^ player) >> shift) & empty
+
+    return moves
+
+
+# Returns the cells of pro reachable from gen by repeatedly shifting left, together with gen itself
+def fill_left(gen: int, pro: int, shift: int) -> int:
+    gen |= pro & (gen << shift)
+    pro &= pro << shift
+    gen |= pro & (gen << 2 * shift)
+    pro &= pro << 2 * shift
+    return gen | (pro & (gen << 4 * shift))
+
+
+# Returns the cells of pro reachable from gen by repeatedly shifting right, together with gen itself
+def fill_right(gen: int, pro: int, shift: int) -> int:
+    gen |= pro & (gen >> shift)
+    pro &= pro >> shift
+    gen |= pro & (gen >> 2 * shift)
+    pro &= pro >> 2 * shift
+    return gen | (pro & (gen >> 4 * shift))
+
+
+# Returns the player's disks that the opponent could flip with a single move if it were their turn
+# A disk is vulnerable when a line through it holds an opponent disk on one side and an empty cell
+# on the other, with only the player's disks in between
+def get_vulnerable(player: int, opponent: int) -> int:
+    empty = ~(player | opponent) & FULL
+    vulnerable = 0
+
+    for shift, mask in SHIFTS:
+        pro = player & mask
+        vulnerable |= fill_left(opponent, pro, shift) & fill_right(empty, pro, shift)
+        vulnerable |= fill_right(opponent, pro, shift) & fill_left(empty, pro, shift)
+
+    return vulnerable & player
+
+
+# Returns the opponent disks flipped when the player places a disk on the given bit
+# Returns 0 if the move flips nothing (and is therefore not a legal move)
+def get_flips(player: int, opponent: int, move: int) -> int:
+    flips = 0
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        gen = move
+        gen |= pro & (gen << shift)
+        pro &= pro << shift
+        gen |= pro & (gen << 2 * shift)
+        pro &= pro << 2 * shift
+        gen |= pro & (gen << 4 * shift)
+        line = gen ^ move
+        if (line << shift) & player:
+            flips |= line
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        gen = move
+        gen |= pro & (gen >> shift)
+        pro &= pro >> shift
+        gen |= pro & (gen >> 2 * shift)
+        pro &= pro >> 2 * shift
+        gen |= pro & (gen >> 4 * shift)
+        line = gen ^ move
+        if (line >> shift) & player:
+            flips |= line
+
+    return flips
+
+
+# Each byte with its bits in reverse order, for mirroring all rows at once
+REVERSED_BYTES = bytes(int(f'{byte:08b}'[::-1], 2) for byte in range(256))
+
+
+# Mirrors the board left to right, moving column c to column 7 - c
+def mirror_columns(bits: int) -> int:
+    return int.from_bytes(bits.to_bytes(8, 'little').translate(REVERSED_BYTES), 'little')
+
+
+# Flips the board upside down, moving row r to row 7 - r
+def flip_rows(bits: int) -> int:
+    return int.from_bytes(bits.to_bytes(8, 'little'), 'big')
+
+
+# Reflects the board in its main diagonal, moving the cell at row r, column c to row c, column r
+def transpose(bits: int) -> int:
+    swapped = 0x0F0F0F0F00000000 & (bits ^ (bits << 28))
+    bits ^= swapped ^ (swapped >> 28)
+    swapped = 0x3333000033330000 & (bits ^ (bits << 14))
+    bits ^= swapped ^ (swapped >> 14)
+    swapped = 0x5500550055005500 & (bits ^ (bits << 7))
+    return bits ^ swapped ^ (swapped >> 7)
+
+
+# The four corner cells
+CORNERS = 0x8100000000000081
+
+# Every cell on the edge of the board, corners included
+EDGES = 0xFF818181818181FF
+
+# Every cell except those in the leftmost column, or in the rightmost column
+NOT_FIRST_COLUMN = 0xFEFEFEFEFEFEFEFE
+NOT_LAST_COLUMN = 0x7F7F7F7F7F7F7F7F
+
+
+# Returns the cells next to any of the given cells in one of the eight directions
+def get_neighbors(bits: int) -> int:
+    horizontal = bits | ((bits << 1) & NOT_FIRST_COLUMN) | ((bits >> 1) & NOT_LAST_COLUMN)
+    return ((horizontal << 8) | horizontal | (horizontal >> 8)) & ~bits & FULL
+
+
+# Each line direction as its shift, with the cells a left shift and a right shift by it can land on, and the
+# cells that have no neighbour in that direction on one side
+STABILITY_DIRECTIONS = ((1, NOT_FIRST_COLUMN, NOT_LAST_COLUMN, 0x8181818181818181),
+                        (7, NOT_LAST_COLUMN, NOT_FIRST_COLUMN, EDGES),
+                        (8, FULL, FULL, 0xFF000000000000FF),
+                        (9, NOT_FIRST_COLUMN, NOT_LAST_COLUMN, EDGES))
+
+
+# Returns the occupied cells whose line in each of the four directions is full, as one bitboard per direction
+def get_full_lines(occupied: int) -> List[int]:
+    empty = ~occupied & FULL
+    return [occupied & ~(fill_left(empty, left, shift) | fill_right(empty, right, shift))
+            for shift, left, right, _ in STABILITY_DIRECTIONS]
+
+
+# Returns the cells that are fixed in each direction regardless of the disks around them: those on a full line in
+# that direction, and those with the edge of the board on one side
+def get_anchored(occupied: int) -> List[int]:
+    return [full | wall for full, (_, _, _, wall) in zip(get_full_lines(occupied), STABILITY_DIRECTIONS)]
+
+
+# Returns the player's disks that can never be flipped, given the cells anchored in each direction
+# A disk can only be flipped along a line through it, so it is stable when, in each of the four directions, it is
+# anchored or has a stable disk of its own on one side. Stable disks are found by adding every disk that meets this
+# for the disks found so far until no more do, which starts from the corners and full lines
+def grow_stable(player: int, anchored: List[int]) -> int:
+    stable = 0
+    candidates = player
+
+    while candidates:
+        added = candidates
+        for (shift, left, right, _), fixed in zip(STABILITY_DIRECTIONS, anchored):
+            added &= fixed | ((stable << shift) & left) | ((stable >> shift) & right)
+        if not added:
+            break
+        stable |= added
+        candidates ^= added
+
+    return stable
+
+
+# Returns the player's disks that can never be flipped for the rest of the game (see grow_stable)
+# This finds every stable disk on the edges, but only a subset of the stable disks inside the board
+def get_stable(player: int, opponent: int) -> int:
+    return get_stable_disks(player, opponent)[0]
+
+
+# Returns the stable disks of both players, sharing the work that does not depend on the color
+def get_stable_disks(black: int, white: int) -> Tuple[int, int]:
+    occupied = black | white
+
+    # Following stable disks along a line always ends at a full line or the edge of the board
+    if not occupied & EDGES:
+        return 0, 0
+
+    anchored = get_anchored(occupied)
+    return grow_stable(black, anchored), grow_stable(white, anchored)
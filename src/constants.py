@@ -12,3 +12,4 @@ DARK_GREEN = (25, 123, 48)
 # Commands
 NO_MOVE = 'NO_MOVE'
 QUIT_GAME = 'QUIT_GAME'
+OUT_OF_TIME = 'OUT_OF_TIME'
@@ -0,0 +1,110 @@
+import numpy as np
+from typing import List, Tuple
+
+from model import State
+
+# Vectorized bitboard operations over arrays of positions, used to build neural network input planes
+# Each position is a pair of uint64 bitboards laid out as in bitboard.py
+
+ZERO = np.uint64(0)
+FULL = np.uint64(0xFFFFFFFFFFFFFFFF)
+INNER_COLUMNS = np.uint64(0x7E7E7E7E7E7E7E7E)
+
+# Shift amounts paired with the mask of disks that may be flanked in that direction (see bitboard.SHIFTS)
+SHIFTS = tuple((np.uint64(shift), mask) for shift, mask in ((1, INNER_COLUMNS), (7, INNER_COLUMNS), (8, FULL), (9, INNER_COLUMNS)))
+
+# Number of input planes: black disks, white disks, valid moves and vulnerable disks
+NUM_PLANES = 4
+
+
+# Returns the cells of pro reachable from gen by repeatedly shifting left, together with gen itself
+def fill_left(gen: np.ndarray, pro: np.ndarray, shift: np.uint64) -> np.ndarray:
+    gen = gen | (pro & (gen << shift))
+    pro = pro & (pro << shift)
+    gen = gen | (pro & (gen << (shift + shift)))
+    pro = pro & (pro << (shift + shift))
+    return gen | (pro & (gen << (shift * np.uint64(4))))
+
+
+# Returns the cells of pro reachable from gen by repeatedly shifting right, together with gen itself
+def fill_right(gen: np.ndarray, pro: np.ndarray, shift: np.uint64) -> np.ndarray:
+    gen = gen | (pro & (gen >> shift))
+    pro = pro & (pro >> shift)
+    gen = gen | (pro & (gen >> (shift + shift)))
+    pro = pro & (pro >> (shift + shift))
+    return gen | (pro & (gen >> (shift * np.uint64(4))))
+
+
+# Returns the valid moves of each player against each opponent (see bitboard.get_moves)
+def get_moves(player: np.ndarray, opponent: np.ndarray) -> np.ndarray:
+    empty = ~(player | opponent)
+    moves = np.zeros_like(player)
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        moves |= ((fill_left(player, pro, shift) ^ player) << shift) & empty
+        moves |= ((fill_right(player, pro, shift) ^ player) >> shift) & empty
+
+    return moves
+
+
+# Returns the disks of each player that each opponent could flip with a single move (see bitboard.get_vulnerable)
+def get_vulnerable(player: np.ndarray, opponent: np.ndarray) -> np.ndarray:
+    empty = ~(player | opponent)
+    vulnerable = np.zeros_like(player)
+
+    for shift, mask in SHIFTS:
+        pro = player & mask
+        vulnerable |= fill_left(opponent, pro, shift) & fill_right(empty, pro, shift)
+        vulnerable |= fill_right(opponent, pro, shift) & fill_left(empty, pro, shift)
+
+    return vulnerable & player
+
+
+# Returns the opponent disks flipped by each player's move, given as a single bit per position (see bitboard.get_flips)
+# Positions whose move is 0 flip nothing
+def get_flips(player: np.ndarray, opponent: np.ndarray, move: np.ndarray) -> np.ndarray:
+    flips = np.zeros_like(player)
+
+    for shift, mask in SHIFTS:
+        pro = opponent & mask
+        line = fill_left(move, pro, shift) ^ move
+        flips |= np.where((line << shift) & player != 0, line, ZERO)
+        line = fill_right(move, pro, shift) ^ move
+        flips |= np.where((line >> shift) & player != 0, line, ZERO)
+
+    return flips
+
+
+# Returns the black and white bitboards of the states as uint64 arrays, and whether black is to move in each
+def to_arrays(states: List[State]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    black = np.fromiter((state.black for state in states), dtype=np.uint64, count=len(states))
+    white = np.fromiter((state.white for state in states), dtype=np.uint64, count=len(states))
+    black_to_move = np.fromiter((state.turn() == State.BLACK for state in states), dtype=bool, count=len(states))
+    return black, white, black_to_move
+
+
+# Expands an array of N bitboards into an N x 8 x 8 array of 0s and 1s
+def to_planes(bitboards: np.ndarray) -> np.ndarray:
+    cells = np.unpackbits(bitboards.astype('<u8').view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+    return cells.reshape(-1, State.SIZE, State.SIZE)
+
+
+# Builds the N x 4 x 8 x 8 neural network input for the states: black disks, white disks,
+# valid moves for the player to move, and disks of either color that can be flipped by the opponent
+# The shipped models were trained while the vulnerable disk check always returned false, so the last plane is all
+# zeros unless vulnerable is set, which is only meant for models trained on the real plane
+def encode_states(states: List[State], vulnerable: bool = False) -> np.ndarray:
+    black, white, black_to_move = to_arrays(states)
+
+    player = np.where(black_to_move, black, white)
+    opponent = np.where(black_to_move, white, black)
+
+    planes = np.stack([
+        black,
+        white,
+        get_moves(player, opponent),
+        get_vulnerable(black, white) | get_vulnerable(white, black) if vulnerable else np.zeros_like(black),
+    ], axis=1)
+
+    return to_planes(planes.reshape(-1)).reshape(len(states), NUM_PLANES, State.SIZE, State.SIZE).astype(np.int8)
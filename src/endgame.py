@@ -0,0 +1,252 @@
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bitboard import FULL, get_flips, get_moves, get_stable_disks, iterate_bits
+
+# Exact endgame search on raw bitboards
+# Scores are final disk differentials (player's disks minus opponent's disks) under perfect play by both sides
+# A player with no valid moves passes, and the game ends when neither player can move
+
+# The four 4x4 quadrants of the board, used for parity move ordering
+QUADRANTS = (0x0F0F0F0F, 0xF0F0F0F0, 0x0F0F0F0F00000000, 0xF0F0F0F000000000)
+
+# Below this many empty cells, moves are ordered by parity alone, which is cheaper than fastest-first ordering
+FASTEST_FIRST_EMPTIES = 7
+
+# Positions with at least this many empty cells are stored in the transposition table
+TABLE_EMPTIES = 6
+
+# Positions with at least this many empty cells are checked for a stability cutoff
+STABILITY_EMPTIES = 8
+
+# The transposition table is cleared when it holds more than this many positions
+MAX_TABLE_ENTRIES = 1 << 20
+
+# Lowest and highest possible final disk differentials
+MIN_SCORE = -64
+MAX_SCORE = 64
+
+
+# Raised by the solver when its deadline passes
+class SolverTimeout(Exception):
+    pass
+
+
+# An exact endgame solver using principal variation search with fastest-first and parity move ordering,
+# a transposition table, stability cutoffs, and specialized routines for the last three empty cells
+# The table is kept from one solve to the next, since the positions of the next move are mostly already in it
+class EndgameSolver:
+    # Number of nodes searched between checks of the clock
+    CLOCK_CHECK_INTERVAL = 1024
+
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.deadline = None
+
+        # Node count at which the clock is checked next; the routines for the last empty cells count their nodes
+        # without checking it, so the count may jump past any given multiple of the interval
+        self.next_clock_check = EndgameSolver.CLOCK_CHECK_INTERVAL
+
+        # Lower and upper bounds on the score of positions and their best move, by (player, opponent) bitboards
+        self.table: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+
+    # Returns the best move (as a bit) and the exact final disk differential for the player to move
+    # If a deadline (from time.perf_counter) is given and passes, raises SolverTimeout
+    def solve(self, player: int, opponent: int, deadline: Optional[float] = None) -> Tuple[Optional[int], int]:
+        self.nodes = 0
+        self.next_clock_check = EndgameSolver.CLOCK_CHECK_INTERVAL
+        self.deadline = deadline
+
+        moves = get_moves(player, opponent)
+        if not moves:
+            return None, player.bit_count() - opponent.bit_count()
+
+        if len(self.table) > MAX_TABLE_ENTRIES:
+            self.table.clear()
+
+        empties = ~(player | opponent) & FULL
+        entry = self.table.get((player, opponent))
+        best_move, best_score = None, -math.inf
+        alpha, beta = MIN_SCORE, MAX_SCORE
+
+        for move, flips in self.order_moves(player, opponent, moves, empties, None if entry is None else entry[2]):
+            score = self.search_move(opponent ^ flips, player | move | flips, alpha, beta, best_move is None)
+            if score > best_score:
+                best_move, best_score = move, score
+                alpha = max(alpha, score)
+
+        return best_move, best_score
+
+    # Returns the score for the player who made a move leading to the position, searching the first move of a node
+    # with the full window and the others with a null window that only shows whether they beat alpha, then again
+    # with the full window if they do
+    def search_move(self, opponent: int, player: int, alpha: int, beta: int, first: bool) -> int:
+        if first or beta - alpha <= 1:
+            return -self.search(opponent, player, -beta, -alpha)
+
+        score = -self.search(opponent, player, -alpha - 1, -alpha)
+        if alpha < score < beta:
+            score = -self.search(opponent, player, -beta, -score)
+        return score
+
+    # Returns the exact score for the player to move, searched within the (alpha, beta) window
+    def search(self, player: int, opponent: int, alpha: int, beta: int) -> int:
+        self.nodes += 1
+        if self.deadline is not None and self.nodes >= self.next_clock_check:
+            self.next_clock_check = self.nodes + EndgameSolver.CLOCK_CHECK_INTERVAL
+            if time.perf_counter() > self.deadline:
+                raise SolverTimeout()
+
+        empties = ~(player | opponent) & FULL
+        num_empties = empties.bit_count()
+
+        if num_empties == 1:
+            return self.solve_last_one(player, opponent, empties)
+        if num_empties == 2:
+            return self.solve_last_two(player, opponent, empties, alpha, beta)
+        if num_empties == 3:
+            return self.solve_last_three(player, opponent, empties, alpha, beta)
+
+        moves = get_moves(player, opponent)
+        if not moves:
+            if get_moves(opponent, player):
+                return -self.search(opponent, player, -beta, -alpha)
+            return player.bit_count() - opponent.bit_count()
+
+        # Stable disks of the opponent stay theirs to the end, which bounds the player's final score
+        # Only worth computing when the opponent has enough disks for the bound to reach alpha, and when enough
+        # cells are empty for a cutoff to save a sizable search
+        if num_empties >= STABILITY_EMPTIES and alpha >= MAX_SCORE - 2 * opponent.bit_count():
+            upper = MAX_SCORE - 2 * get_stable_disks(opponent, player)[0].bit_count()
+            if upper <= alpha:
+                return upper
+            beta = min(beta, upper)
+
+        key, table_move = None, None
+        if num_empties >= TABLE_EMPTIES:
+            key = (player, opponent)
+            entry = self.table.get(key)
+            if entry is not None:
+                lower, upper, table_move = entry
+                if lower >= beta:
+                    return lower
+                if upper <= alpha or lower == upper:
+                    return upper
+                alpha, beta = max(alpha, lower), min(beta, upper)
+
+        original_alpha = alpha
+        best_score, best_move = -math.inf, None
+        for move, flips in self.order_moves(player, opponent, moves, empties, table_move):
+            score = self.search_move(opponent ^ flips, player | move | flips, alpha, beta, best_move is None)
+            if score > best_score:
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if key is not None:
+            if best_score <= original_alpha:
+                self.table[key] = (MIN_SCORE, best_score, best_move)
+            elif best_score >= beta:
+                self.table[key] = (best_score, MAX_SCORE, best_move)
+            else:
+                self.table[key] = (best_score, best_score, best_move)
+
+        return best_score
+
+    # Returns the moves and the disks they flip in search order: the best move found earlier first, then fewest
+    # replies for the opponent first while many cells are empty, and in any case moves in quadrants with an odd
+    # number of empty cells before the others
+    def order_moves(self, player: int, opponent: int, moves: int, empties: int,
+                    first_move: Optional[int] = None) -> List[Tuple[int, int]]:
+        odd_quadrants = 0
+        for quadrant in QUADRANTS:
+            if (empties & quadrant).bit_count() & 1:
+                odd_quadrants |= quadrant
+
+        ordered = []
+        fastest_first = empties.bit_count() >= FASTEST_FIRST_EMPTIES
+
+        for index in iterate_bits(moves):
+            move = 1 << index
+            flips = get_flips(player, opponent, move)
+            key = 0 if move & odd_quadrants else 1
+            if fastest_first:
+                key += get_moves(opponent ^ flips, player | move | flips).bit_count() * 2
+            if move == first_move:
+                key = -1
+            ordered.append((key, move, flips))
+
+        ordered.sort()
+        return [(move, flips) for _, move, flips in ordered]
+
+    # Final score with one empty cell, which the opponent fills if the player cannot
+    def solve_last_one(self, player: int, opponent: int, empty: int) -> int:
+        score = player.bit_count() - opponent.bit_count()
+
+        flips = get_flips(player, opponent, empty)
+        if flips:
+            return score + 2 * flips.bit_count() + 1
+
+        flips = get_flips(opponent, player, empty)
+        if flips:
+            return score - 2 * flips.bit_count() - 1
+
+        return score
+
+    # Final score with two empty cells
+    def solve_last_two(self, player: int, opponent: int, empties: int, alpha: int, beta: int) -> int:
+        best_score = -math.inf
+
+        for index in iterate_bits(empties):
+            move = 1 << index
+            flips = get_flips(player, opponent, move)
+            if not flips:
+                continue
+
+            self.nodes += 1
+            score = -self.solve_last_one(opponent ^ flips, player | move | flips, empties ^ move)
+            if score > best_score:
+                best_score = score
+                if score >= beta:
+                    return score
+
+        if best_score == -math.inf:
+            if get_moves(opponent, player):
+                return -self.solve_last_two(opponent, player, empties, -beta, -alpha)
+            return player.bit_count() - opponent.bit_count()
+
+        return best_score
+
+    # Final score with three empty cells, trying the cell alone in its quadrant first
+    def solve_last_three(self, player: int, opponent: int, empties: int, alpha: int, beta: int) -> int:
+        indices = iterate_bits(empties)
+        indices.sort(key=lambda index: 0 if (empties & EndgameSolver.quadrant(index)).bit_count() == 1 else 1)
+
+        best_score = -math.inf
+        for index in indices:
+            move = 1 << index
+            flips = get_flips(player, opponent, move)
+            if not flips:
+                continue
+
+            self.nodes += 1
+            score = -self.solve_last_two(opponent ^ flips, player | move | flips, empties ^ move, -beta, -max(alpha, best_score))
+            if score > best_score:
+                best_score = score
+                if score >= beta:
+                    return score
+
+        if best_score == -math.inf:
+            if get_moves(opponent, player):
+                return -self.solve_last_three(opponent, player, empties, -beta, -alpha)
+            return player.bit_count() - opponent.bit_count()
+
+        return best_score
+
+    # Returns the quadrant mask containing the given cell index
+    @staticmethod
+    def quadrant(index: int) -> int:
+        return QUADRANTS[(index >> 5) * 2 + ((index & 7) >> 2)]
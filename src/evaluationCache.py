@@ -0,0 +1,146 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+import symmetry
+from agents import Agent, CompositeAgent
+from model import Coordinate, State
+
+# A cached evaluation: a utility, or the unweighted component utilities of a composite agent
+CachedValue = Union[float, Tuple[float, ...]]
+
+
+# A size-bounded map from (agent, position) keys to evaluations that evicts the least recently used entry
+# A cache can be shared by several cached agents, whose entries are kept apart by agent identity
+class EvaluationCache:
+    def __init__(self, max_entries: int = 1 << 16) -> None:
+        if max_entries <= 0:
+            raise ValueError("An evaluation cache needs room for at least one entry")
+
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[Hashable, CachedValue]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the cached value for the key, or None if it is not cached
+    def lookup(self, key: Hashable) -> Optional[CachedValue]:
+        value = self.entries.get(key)
+
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def store(self, key: Hashable, value: CachedValue) -> None:
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the fraction of lookups that found an entry
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __str__(self) -> str:
+        return f"{len(self.entries)} entries, {self.hits} hits, {self.misses} misses ({round(self.hit_rate() * 100, 1)}% hit rate)"
+
+
+# Agent that remembers the evaluations of another agent, keyed by the Zobrist hash of the position
+# The hash is taken as it is before the player to move is resolved, so that looking up a leaf of a search does not
+# generate its moves; the player to move follows from the disks and the unresolved side, so the key still decides it
+# For a composite agent, the cache holds the utility of each component, so both the weighted utility and the
+# breakdown cost a dictionary lookup
+# If symmetric is true, positions are keyed by their canonical form so all eight symmetric images share an entry,
+# which is only correct for evaluation functions that are themselves symmetric and only pays off for slow ones
+class CachedAgent(Agent):
+    def __init__(self, agent: Agent, max_entries: int = 1 << 16, symmetric: bool = False,
+                 cache: Optional[EvaluationCache] = None) -> None:
+        self.agent = agent
+        self.cache = EvaluationCache(max_entries) if cache is None else cache
+        self.symmetric = symmetric
+        self.batch_evaluation = agent.batch_evaluation
+
+    # Returns the cache key of the state for this agent
+    def key(self, state: State) -> Hashable:
+        if self.symmetric:
+            black, white, _ = symmetry.canonical_bitboards(state.black, state.white)
+            return id(self.agent), black, white, state.side
+        return id(self.agent), state.key
+
+    def evaluate(self, state: State) -> float:
+        key = self.key(state)
+        value = self.cache.lookup(key)
+
+        if value is None:
+            value = self.compute(state)
+            self.cache.store(key, value)
+
+        return self.utility(state, value)
+
+    def evaluate_batch(self, states: List[State]) -> List[float]:
+        keys = [self.key(state) for state in states]
+        values = [self.cache.lookup(key) for key in keys]
+
+        missing = [index for index, value in enumerate(values) if value is None]
+        if missing:
+            if isinstance(self.agent, CompositeAgent):
+                computed = [self.compute(states[index]) for index in missing]
+            else:
+                computed = self.agent.evaluate_batch([states[index] for index in missing])
+            for index, value in zip(missing, computed):
+                values[index] = value
+                self.cache.store(keys[index], value)
+
+        return [self.utility(state, value) for state, value in zip(states, values)]
+
+    # Returns the unweighted utility of each component of a composite agent
+    def evaluate_components(self, state: State) -> Tuple[float, ...]:
+        if not isinstance(self.agent, CompositeAgent):
+            raise TypeError(f"{self.agent} is not a composite agent")
+
+        key = self.key(state)
+        value = self.cache.lookup(key)
+
+        if value is None:
+            value = self.compute(state)
+            self.cache.store(key, value)
+
+        return value
+
+    # Evaluates the state with the wrapped agent, in the form in which it is cached
+    def compute(self, state: State) -> CachedValue:
+        if isinstance(self.agent, CompositeAgent):
+            return tuple(self.agent.evaluate_components(state))
+        return self.agent.evaluate(state)
+
+    # Ties are broken as the wrapped agent breaks them, since some agents play by their tiebreaker
+    def tiebreaker(self, actions: List[Coordinate]) -> Coordinate:
+        return self.agent.tiebreaker(actions)
+
+    # Turns a cached value back into a utility
+    def utility(self, state: State, value: CachedValue) -> float:
+        if isinstance(value, tuple):
+            return self.agent.combine(state, value)
+        return value
+
+    def statistics(self) -> Dict[str, float]:
+        return {**self.agent.statistics(), 'evaluation_cache_hits': self.cache.hits,
+                'evaluation_cache_misses': self.cache.misses}
+
+    def close(self) -> None:
+        self.agent.close()
+
+    def __str__(self) -> str:
+        return f"Cached {self.agent}"
@@ -0,0 +1,167 @@
+import numpy as np
+from typing import List, NamedTuple, Tuple, Union
+
+import bitboard
+import encoding
+from model import State
+
+# Features of a position that heuristic evaluators read, computed together in a single pass over the bitboards
+# extract returns them for one state as ints, and extract_batch for many states as NumPy arrays
+
+# Default weight of each cell for the positional sum
+POSITIONAL_WEIGHTS = [[100, -25,  50, 10, 10,  50, -25, 100],
+                      [-25, -50, -10, -5, -5, -10, -50, -25],
+                      [ 50, -10,   5,  1,  1,   5, -10,  50],
+                      [ 10,  -5,   1, -1, -1,   1,  -5,  10],
+                      [ 10,  -5,   1, -1, -1,   1,  -5,  10],
+                      [ 50, -10,   5,  1,  1,   5, -10,  50],
+                      [-25, -50, -10, -5, -5, -10, -50, -25],
+                      [100, -25,  50, 10, 10,  50, -25, 100]]
+
+
+# An int for a single state, or an array with one entry per state for a batch
+Feature = Union[int, np.ndarray]
+
+
+class Features(NamedTuple):
+    black_to_move: Feature
+    black_disks: Feature
+    white_disks: Feature
+    # Number of valid moves each player would have if it were their turn
+    black_mobility: Feature
+    white_mobility: Feature
+    # Disks next to an empty cell
+    black_frontier: Feature
+    white_frontier: Feature
+    # Sum of the positional weights of black's disks minus that of white's disks
+    positional: Feature
+    black_corners: Feature
+    white_corners: Feature
+    # Disks on the edge of the board, corners included
+    black_edges: Feature
+    white_edges: Feature
+    # Disks that can never be flipped (see bitboard.grow_stable)
+    black_stable: Feature
+    white_stable: Feature
+
+
+# Groups the cells of a weight grid into one bitboard per distinct weight
+def weight_masks(weights: List[List[int]]) -> List[Tuple[int, int]]:
+    masks = {}
+    for row in range(State.SIZE):
+        for col in range(State.SIZE):
+            masks[weights[row][col]] = masks.get(weights[row][col], 0) | bitboard.square(row, col)
+    return [(weight, mask) for weight, mask in masks.items() if weight != 0]
+
+
+# Returns the weighted sum of the cells of black's disks minus that of white's disks
+def positional_sum(black: int, white: int, masks: List[Tuple[int, int]]) -> int:
+    utility = 0
+    for weight, mask in masks:
+        utility += weight * ((black & mask).bit_count() - (white & mask).bit_count())
+    return utility
+
+
+POSITIONAL_MASKS = weight_masks(POSITIONAL_WEIGHTS)
+
+
+# Computes the features of the state
+def extract(state: State) -> Features:
+    black, white = state.black, state.white
+    black_to_move = state.turn() == State.BLACK
+
+    if black_to_move:
+        black_moves, white_moves = state.valid_moves_bitboard(), bitboard.get_moves(white, black)
+    else:
+        black_moves, white_moves = bitboard.get_moves(black, white), state.valid_moves_bitboard()
+
+    frontier = bitboard.get_neighbors(~(black | white) & bitboard.FULL)
+    black_stable, white_stable = bitboard.get_stable_disks(black, white)
+
+    return Features(
+        black_to_move,
+        state.black_disks(),
+        state.white_disks(),
+        black_moves.bit_count(),
+        white_moves.bit_count(),
+        (black & frontier).bit_count(),
+        (white & frontier).bit_count(),
+        positional_sum(black, white, POSITIONAL_MASKS),
+        (black & bitboard.CORNERS).bit_count(),
+        (white & bitboard.CORNERS).bit_count(),
+        (black & bitboard.EDGES).bit_count(),
+        (white & bitboard.EDGES).bit_count(),
+        black_stable.bit_count(),
+        white_stable.bit_count(),
+    )
+
+
+CORNERS = np.uint64(bitboard.CORNERS)
+EDGES = np.uint64(bitboard.EDGES)
+NOT_FIRST_COLUMN = np.uint64(bitboard.NOT_FIRST_COLUMN)
+NOT_LAST_COLUMN = np.uint64(bitboard.NOT_LAST_COLUMN)
+ONE = np.uint64(1)
+ROW = np.uint64(State.SIZE)
+STABILITY_DIRECTIONS = tuple(tuple(np.uint64(value) for value in direction) for direction in bitboard.STABILITY_DIRECTIONS)
+
+
+# Returns the cells next to any of the given cells, for each bitboard (see bitboard.get_neighbors)
+def get_neighbors(bits: np.ndarray) -> np.ndarray:
+    horizontal = bits | ((bits << ONE) & NOT_FIRST_COLUMN) | ((bits >> ONE) & NOT_LAST_COLUMN)
+    return ((horizontal << ROW) | horizontal | (horizontal >> ROW)) & ~bits
+
+
+# Returns the stable disks of both players in each position (see bitboard.get_stable_disks)
+# Every position takes as many rounds as the slowest one, in which the others no longer change
+def get_stable_disks(black: np.ndarray, white: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    occupied = black | white
+    empty = ~occupied
+    anchored = [(occupied & ~(encoding.fill_left(empty, left, shift) | encoding.fill_right(empty, right, shift))) | wall
+                for shift, left, right, wall in STABILITY_DIRECTIONS]
+
+    stable = []
+    for player in (black, white):
+        player_stable = np.zeros_like(player)
+        while True:
+            added = player & ~player_stable
+            for (shift, left, right, _), fixed in zip(STABILITY_DIRECTIONS, anchored):
+                added &= fixed | ((player_stable << shift) & left) | ((player_stable >> shift) & right)
+            if not added.any():
+                break
+            player_stable |= added
+        stable.append(player_stable)
+
+    return stable[0], stable[1]
+
+
+# Returns the number of set bits of each bitboard
+def count_bits(bits: np.ndarray) -> np.ndarray:
+    return encoding.to_planes(bits).reshape(len(bits), -1).sum(axis=1, dtype=np.int64)
+
+
+# Computes the features of many states at once; each field is an array with one entry per state
+def extract_batch(states: List[State]) -> Features:
+    black, white, black_to_move = encoding.to_arrays(states)
+    frontier = get_neighbors(~(black | white))
+    black_stable, white_stable = get_stable_disks(black, white)
+
+    weights = np.asarray(POSITIONAL_WEIGHTS, dtype=np.int64).reshape(-1)
+    cells = encoding.to_planes(black).reshape(len(states), -1).astype(np.int64) \
+        - encoding.to_planes(white).reshape(len(states), -1).astype(np.int64)
+
+    return Features(
+        black_to_move,
+        count_bits(black),
+        count_bits(white),
+        count_bits(encoding.get_moves(black, white)),
+        count_bits(encoding.get_moves(white, black)),
+        count_bits(black & frontier),
+        count_bits(white & frontier),
+        cells @ weights,
+        count_bits(black & CORNERS),
+        count_bits(white & CORNERS),
+        count_bits(black & EDGES),
+        count_bits(white & EDGES),
+        count_bits(black_stable),
+        count_bits(white_stable),
+    )
@@ -0,0 +1,95 @@
+import time
+from typing import Dict, NamedTuple, Optional
+
+from model import State
+
+# What happens when a player runs out of time: they lose the game, or every move they make from then on is a
+# cheap fallback move instead of their agent's
+FORFEIT = 'forfeit'
+FALLBACK = 'fallback'
+OVERRUN_POLICIES = (FORFEIT, FALLBACK)
+
+
+# A time control: each player starts with bank seconds and gains increment seconds after each of their moves
+class TimeControl(NamedTuple):
+    bank: float
+    increment: float = 0.0
+    overrun: str = FORFEIT
+
+    # Raises a ValueError if the time control cannot be played
+    def check(self) -> None:
+        if self.bank <= 0:
+            raise ValueError("A game clock needs a positive time bank")
+        if self.increment < 0:
+            raise ValueError("A game clock needs an increment of zero or more")
+        if self.overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"Unknown overrun policy {self.overrun}, expected one of {', '.join(OVERRUN_POLICIES)}")
+
+    def __str__(self) -> str:
+        return f"{self.bank:g}+{self.increment:g} s, {self.overrun} on overrun"
+
+
+# The clocks of both players in one game
+# A player's clock runs from start() to stop(); a player whose clock runs out has flagged, and keeps the flag for
+# the rest of the game
+class GameClock:
+    # Share of the time allotted to a move that the agent is asked to use, leaving the rest for returning the move
+    SAFETY_MARGIN = 0.9
+
+    # A move is never allotted less than this share of the player's remaining time
+    MIN_MOVES_TO_GO = 4
+
+    def __init__(self, time_control: TimeControl) -> None:
+        time_control.check()
+        self.time_control = time_control
+
+        # Time left, time used and moves made by each player in seconds, and whether they ran out of time
+        self.remaining: Dict[int, float] = {State.BLACK: time_control.bank, State.WHITE: time_control.bank}
+        self.used: Dict[int, float] = {State.BLACK: 0.0, State.WHITE: 0.0}
+        self.moves: Dict[int, int] = {State.BLACK: 0, State.WHITE: 0}
+        self.flagged: Dict[int, bool] = {State.BLACK: False, State.WHITE: False}
+
+        # The player whose clock is running and when it was started
+        self.running: Optional[int] = None
+        self.start_time = 0.0
+
+    # Starts the clock of the player to move and returns the time.perf_counter() deadline of their move
+    # The player is allotted an even share of their remaining time over the moves they are likely still to make,
+    # plus the increment they will gain back
+    def start(self, state: State) -> float:
+        player = state.turn()
+        empty_cells = State.SIZE * State.SIZE - state.black_disks() - state.white_disks()
+        moves_to_go = max(GameClock.MIN_MOVES_TO_GO, (empty_cells + 1) // 2)
+        remaining = self.remaining[player]
+        allotted = min(remaining, remaining / moves_to_go + self.time_control.increment)
+
+        self.running = player
+        self.start_time = time.perf_counter()
+        return self.start_time + allotted * GameClock.SAFETY_MARGIN
+
+    # Returns true if the player whose clock is running has used up their remaining time
+    def expired(self) -> bool:
+        return self.running is not None and time.perf_counter() - self.start_time > self.remaining[self.running]
+
+    # Stops the running clock after the player's move and returns true if they ran out of time making it
+    def stop(self) -> bool:
+        player = self.running
+        elapsed = time.perf_counter() - self.start_time
+        self.running = None
+
+        self.used[player] += elapsed
+        self.moves[player] += 1
+        self.remaining[player] -= elapsed
+
+        if self.remaining[player] < 0:
+            self.remaining[player] = 0.0
+            self.flagged[player] = True
+            return True
+
+        self.remaining[player] += self.time_control.increment
+        return False
+
+    # Returns the clock counters of the player, in the form of agent statistics
+    def statistics(self, player: int) -> Dict[str, float]:
+        return {'clock_time': self.used[player], 'clock_moves': self.moves[player],
+                'clock_overruns': int(self.flagged[player])}
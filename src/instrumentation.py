@@ -0,0 +1,105 @@
+import time
+from typing import Callable, Dict, List
+
+from model import SearchState, State
+
+# Opt-in statistics about each search an agent runs to choose a move
+# Agents collect them only once instrument() is called on them, so uninstrumented agents pay nothing for timing.
+# Each move gives a record of counters, which add up over a game or a tournament with aggregate()
+
+# Phases of a search whose time is measured: ordering the valid moves, making and undoing moves, and evaluating
+PHASES = ('move_generation', 'make_move', 'evaluate')
+
+# Values worked out from the counters of a record, which are recomputed rather than added up when aggregating
+DERIVED = ('nodes_per_second', 'playouts_per_second', 'branching_factor', 'cutoff_rate', 'first_move_cutoff_rate')
+
+
+# The per-move records of an agent and the time spent in each phase of the current search
+class SearchInstruments:
+    def __init__(self) -> None:
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+        self.records: List[Dict[str, float]] = []
+
+    # Returns the function wrapped so that the time spent in it is added to the phase
+    def timed(self, phase: str, function: Callable) -> Callable:
+        phase_times = self.phase_times
+
+        def timed_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                phase_times[phase] += time.perf_counter() - start_time
+
+        return timed_function
+
+    # Clears the phase times before a search
+    def start_move(self) -> None:
+        for phase in PHASES:
+            self.phase_times[phase] = 0.0
+
+    # Stores the counters of a finished search along with the times of the phases it went through
+    def record(self, counters: Dict[str, float]) -> None:
+        record = dict(counters)
+        for phase, phase_time in self.phase_times.items():
+            if phase_time:
+                record[phase + '_time'] = phase_time
+        self.records.append(derive(record))
+
+    # Returns the records since the last call and forgets them
+    def take_records(self) -> List[Dict[str, float]]:
+        records, self.records = self.records, []
+        return records
+
+
+# A search state that adds the time spent making and undoing moves to the make_move phase
+class TimedSearchState(SearchState):
+    __slots__ = ('phase_times',)
+
+    def __init__(self, state: State, instruments: SearchInstruments) -> None:
+        super().__init__(state)
+        self.phase_times = instruments.phase_times
+
+    def make_move(self, action) -> None:
+        start_time = time.perf_counter()
+        try:
+            super().make_move(action)
+        finally:
+            self.phase_times['make_move'] += time.perf_counter() - start_time
+
+    def undo_move(self) -> None:
+        start_time = time.perf_counter()
+        super().undo_move()
+        self.phase_times['make_move'] += time.perf_counter() - start_time
+
+
+# Adds the values worked out from the counters to the record and returns it
+def derive(record: Dict[str, float]) -> Dict[str, float]:
+    if record.get('time'):
+        if 'nodes' in record:
+            record['nodes_per_second'] = record['nodes'] / record['time']
+        if 'playouts' in record:
+            record['playouts_per_second'] = record['playouts'] / record['time']
+    if record.get('interior_nodes'):
+        record['branching_factor'] = record['branches'] / record['interior_nodes']
+        record['cutoff_rate'] = record['cutoffs'] / record['interior_nodes']
+    if record.get('cutoffs'):
+        record['first_move_cutoff_rate'] = record['first_move_cutoffs'] / record['cutoffs']
+    return record
+
+
+# Adds up the counters of the records of several moves; the depth becomes the average depth reached
+def aggregate(records: List[Dict[str, float]]) -> Dict[str, float]:
+    totals = {'moves': len(records)}
+    depths = []
+
+    for record in records:
+        for key, value in record.items():
+            if key == 'depth':
+                depths.append(value)
+            elif key not in DERIVED and isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+
+    if depths:
+        totals['depth'] = sum(depths) / len(depths)
+    return derive(totals)
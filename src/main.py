@@ -1,33 +1,95 @@
 import argparse
+import json
 import pygame
+import random
 import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from time import sleep
-from typing import List, Tuple
-
-from agents import Agent, ManualAgent, MobilityAgent, MostDisksAgent, PositionalAgent, StabilityAgent, RadiusAgent, SuperiorAgent
-from deepLearningAgents import NeuralNetworkAgent
-from minimax import MinimaxAgent
-from constants import WINDOW_HEIGHT, WINDOW_WIDTH, NO_MOVE, QUIT_GAME
-from model import State
-
-AGENT_CHOICES = {
-    'manual': ManualAgent,
-    'random': Agent,
-    'most_disks': MostDisksAgent,
-    'mobility': MobilityAgent,
-    'positional': PositionalAgent,
-    'stability': StabilityAgent,
-    'radius': RadiusAgent,
-    'neural': NeuralNetworkAgent,
-    'superior': SuperiorAgent,
-}
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from agents import Agent, ManualAgent, PositionalAgent
+from mcts import RANDOM, MCTSAgent
+from minimax import ALGORITHMS, ALPHA_BETA, MinimaxAgent
+from parallel import ParallelMinimaxAgent
+from pondering import PonderingAgent
+from constants import WINDOW_HEIGHT, WINDOW_WIDTH, NO_MOVE, OUT_OF_TIME, QUIT_GAME
+from evaluationCache import CachedAgent
+from gameClock import FORFEIT, OVERRUN_POLICIES, GameClock, TimeControl
+from instrumentation import aggregate
+from model import Coordinate, State
+from openingBook import BookAgent, OpeningBook
+from probcut import ProbCut
+from registry import AGENT_CHOICES
+from renderer import Renderer
+
+# The Main instance owned by each tournament worker process, created once by the pool initializer
+_worker_main = None
+
+
+def _initialize_game_worker(agent_args: Dict[str, Any], num_repeat: int, slow: bool, instrument: bool,
+                            time_control: Optional[TimeControl]) -> None:
+    global _worker_main
+    black_agent, white_agent = Main.get_agents(**agent_args)
+    _worker_main = Main(black_agent, white_agent, num_repeat, slow, time_control=time_control)
+    if instrument:
+        black_agent.instrument()
+        white_agent.instrument()
+
+
+# Plays one command line game in a tournament worker process with the given random seed
+def _play_game(seed: int) -> "GameResult":
+    return _worker_main.play_game(seed, False)
+
+
+# The outcome of one game: the winner, how much each agent's statistics changed during it, and the search
+# statistics of each move of instrumented agents
+class GameResult(NamedTuple):
+    seed: int
+    winner: int
+    black_statistics: Dict[str, float]
+    white_statistics: Dict[str, float]
+    black_moves: List[Dict[str, float]]
+    white_moves: List[Dict[str, float]]
+
 
 class Main:
-    def __init__(self, black_agent: Agent, white_agent: Agent, num_repeat: int, slow: bool) -> None:
+    # To play games in parallel (jobs > 1), agent_args must hold the keyword arguments of get_agents so each
+    # worker process can build its own agents
+    # With a stats_path, the agents are instrumented and the statistics of every move, every game and the whole
+    # tournament are written to that file as JSON lines
+    # With a time_control, every game is played on a clock and agents are given a deadline for each move; an agent
+    # may then only ponder against a human, since pondering against another agent in this process takes CPU time
+    # that is charged to the opponent's clock
+    def __init__(self, black_agent: Agent, white_agent: Agent, num_repeat: int, slow: bool, jobs: int = 1,
+                 seed: Optional[int] = None, agent_args: Optional[Dict[str, Any]] = None,
+                 stats_path: Optional[str] = None, time_control: Optional[TimeControl] = None) -> None:
         self.black_agent = black_agent
         self.white_agent = white_agent
         self.num_repeat = num_repeat
         self.slow = slow
+        self.jobs = jobs
+        # Game i is played with random seed seed + i, so a tournament can be replayed
+        self.seed = random.randrange(2 ** 32) if seed is None else seed
+        self.agent_args = agent_args
+        self.stats_path = stats_path
+        self.time_control = time_control
+
+        if time_control is not None:
+            time_control.check()
+            for agent, opponent in [(black_agent, white_agent), (white_agent, black_agent)]:
+                if agent.ponders and not isinstance(opponent, ManualAgent):
+                    raise ValueError(f"Agents may only ponder against a human on a clock, since pondering would take "
+                                     f"time from the clock of {opponent}")
+
+        # Plays the moves of a player who ran out of time under the fallback policy, in a few microseconds each
+        self.fallback_agent = PositionalAgent()
+
+        # The clock of the game being played and the deadline of the current move
+        self.clock = None
+        self.deadline = None
+        if stats_path is not None:
+            black_agent.instrument()
+            white_agent.instrument()
 
     def run_game(self, is_interactive: bool) -> None:
         print("------------------")
@@ -35,16 +97,24 @@ class Main:
         print("------------------\n")
 
         num_wins_black, num_wins_white, num_ties = 0, 0, 0
+        black_statistics, white_statistics = {}, {}
+        black_moves, white_moves = [], []
+        stats_file = None if self.stats_path is None else open(self.stats_path, 'w')
         
-        start_time = time.time()
+        start_time = time.perf_counter()
+        results = self.play_games(is_interactive)
         for i in range(self.num_repeat):
             if i % 10 == 0:
                 print(f'Round {i} - {num_wins_black} - {num_wins_white} - {num_ties}')
 
-            if is_interactive:
-                winner = self.run_game_gui()
-            else:
-                winner = self.run_game_command_line()
+            result = next(results)
+            winner = result.winner
+            Main.add_statistics(black_statistics, result.black_statistics)
+            Main.add_statistics(white_statistics, result.white_statistics)
+            if stats_file is not None:
+                Main.write_game_statistics(stats_file, result)
+                black_moves.extend(result.black_moves)
+                white_moves.extend(result.white_moves)
             
             if winner == State.BLACK:
                 num_wins_black += 1
@@ -53,13 +123,146 @@ class Main:
             else:
                 num_ties += 1
 
+        run_time = time.perf_counter() - start_time
+
+        if stats_file is not None:
+            for player, moves in [('black', black_moves), ('white', white_moves)]:
+                Main.write_statistics(stats_file, {'type': 'tournament', 'player': player, **aggregate(moves)})
+            stats_file.close()
+
         print('\nGAME SUMMARY')
-        print(f'The code took {round(time.time() - start_time)} seconds to run')
-        print(f'Number of games played: {self.num_repeat}')
+        print(f'The code took {round(run_time)} seconds to run')
+        games_per_second = f'{round(self.num_repeat / run_time, 3)} games/sec' if run_time > 0 else 'too fast to time'
+        print(f'Number of games played: {self.num_repeat} (seed {self.seed}, {games_per_second})')
         print(f'Black ({self.black_agent}): {num_wins_black} (win rate: {round(num_wins_black / self.num_repeat * 100, 3)}%)')
         print(f'White ({self.white_agent}): {num_wins_white} (win rate: {round(num_wins_white / self.num_repeat * 100, 3)}%)')
         print(f'Ties: {num_ties}')
 
+        if self.time_control is not None:
+            print(f'Time control: {self.time_control}')
+            for name, statistics in [('Black', black_statistics), ('White', white_statistics)]:
+                clock_time, clock_moves = statistics.pop('clock_time'), statistics.pop('clock_moves')
+                overruns = statistics.pop('clock_overruns')
+                print(f'{name} clock: {round(clock_time, 3)} seconds over {clock_moves} moves '
+                      f'({round(clock_time / max(clock_moves, 1) * 1000, 1)} ms per move), ran out of time in {overruns} games')
+
+        for name, statistics in [('Black', black_statistics), ('White', white_statistics)]:
+            if statistics:
+                descriptions = [f'{key.replace("_", " ")} {round(value, 3)}' for key, value in statistics.items()]
+                # Every pair of hit and miss counters also gets a hit rate
+                for key, hits in statistics.items():
+                    if key.endswith('_hits'):
+                        prefix = key[:-len('_hits')]
+                        lookups = hits + statistics.get(prefix + '_misses', 0)
+                        if lookups > 0:
+                            descriptions.append(f'{prefix.replace("_", " ")} hit rate {round(hits / lookups * 100, 1)}%')
+                print(f'{name} statistics: ' + ', '.join(descriptions))
+
+        if self.stats_path is not None:
+            print(f'Search statistics written to {self.stats_path}')
+
+        self.black_agent.close()
+        self.white_agent.close()
+
+    # Writes a line for each move of the game and a line for each player's totals over the game
+    @staticmethod
+    def write_game_statistics(stats_file, result: GameResult) -> None:
+        for player, moves in [('black', result.black_moves), ('white', result.white_moves)]:
+            for move, record in enumerate(moves):
+                Main.write_statistics(stats_file, {'type': 'move', 'seed': result.seed, 'player': player,
+                                                   'move': move, **record})
+            Main.write_statistics(stats_file, {'type': 'game', 'seed': result.seed, 'player': player,
+                                               'winner': result.winner, **aggregate(moves)})
+
+    @staticmethod
+    def write_statistics(stats_file, statistics: Dict[str, Any]) -> None:
+        stats_file.write(json.dumps(statistics) + '\n')
+
+    # Plays every game and yields the results of play_game in the order the games finish
+    def play_games(self, is_interactive: bool) -> Iterator[GameResult]:
+        if self.jobs > 1 and not is_interactive:
+            yield from self.play_games_parallel()
+            return
+
+        for i in range(self.num_repeat):
+            yield self.play_game(self.seed + i, is_interactive)
+
+    # Spreads the games over a pool of worker processes, each of which builds its own agents
+    def play_games_parallel(self) -> Iterator[GameResult]:
+        if self.agent_args is None:
+            raise ValueError("agent_args is required to play games in parallel")
+
+        initargs = (self.agent_args, self.num_repeat, self.slow, self.stats_path is not None, self.time_control)
+        with ProcessPoolExecutor(self.jobs, initializer=_initialize_game_worker, initargs=initargs) as pool:
+            futures = [pool.submit(_play_game, self.seed + i) for i in range(self.num_repeat)]
+            for future in as_completed(futures):
+                yield future.result()
+
+    # Plays one game with the given random seed
+    def play_game(self, seed: int, is_interactive: bool) -> GameResult:
+        random.seed(seed)
+        black_statistics, white_statistics = self.black_agent.statistics(), self.white_agent.statistics()
+        self.clock = None if self.time_control is None else GameClock(self.time_control)
+
+        if is_interactive:
+            winner = self.run_game_gui()
+        else:
+            winner = self.run_game_command_line()
+
+        # The agent that moved last may still be pondering on a position that will not come up
+        self.black_agent.stop_thinking()
+        self.white_agent.stop_thinking()
+
+        black_statistics = Main.subtract_statistics(self.black_agent.statistics(), black_statistics)
+        white_statistics = Main.subtract_statistics(self.white_agent.statistics(), white_statistics)
+        if self.clock is not None:
+            black_statistics.update(self.clock.statistics(State.BLACK))
+            white_statistics.update(self.clock.statistics(State.WHITE))
+
+        return GameResult(seed, winner, black_statistics, white_statistics,
+                          self.black_agent.take_move_records(), self.white_agent.take_move_records())
+
+    # Returns the move of the agent of the player to move, keeping their clock if the game is played on one
+    # Agents that poll for input (such as manual players in the GUI) return NO_MOVE until they have a move, and the
+    # clock keeps running across calls
+    # When the player runs out of time, returns OUT_OF_TIME if they forfeit the game, and otherwise replaces their
+    # move and all of their later moves with fallback moves
+    def get_move(self, state: State) -> Union[Coordinate, str]:
+        agent = self.black_agent if state.turn() == State.BLACK else self.white_agent
+        clock = self.clock
+        if clock is None:
+            return agent.get_action(state)
+
+        if clock.flagged[state.turn()]:
+            return self.fallback_agent.get_action(state)
+
+        if clock.running is None:
+            self.deadline = clock.start(state)
+
+        move = agent.get_action(state, self.deadline)
+        if move == NO_MOVE and not clock.expired():
+            return move
+        if move == QUIT_GAME:
+            return move
+
+        if not clock.stop():
+            return move
+
+        # The agent's move is not played, so neither is the reply it may be pondering on
+        agent.stop_thinking()
+        if self.time_control.overrun == FORFEIT:
+            return OUT_OF_TIME
+        return self.fallback_agent.get_action(state)
+
+    @staticmethod
+    def add_statistics(total: Dict[str, float], statistics: Dict[str, float]) -> None:
+        for key, value in statistics.items():
+            total[key] = total.get(key, 0) + value
+
+    @staticmethod
+    def subtract_statistics(after: Dict[str, float], before: Dict[str, float]) -> Dict[str, float]:
+        return {key: value - before.get(key, 0) for key, value in after.items()}
+
     # Runs a game of Reversi with the specified preferences
     def run_game_command_line(self) -> int:
         state = State()
@@ -68,17 +271,18 @@ class Main:
             if self.num_repeat == 1:
                 print(state)
 
-            if state.turn() == State.BLACK:
-                if self.num_repeat == 1:
-                    print("Black's turn\n")
-                move = self.black_agent.get_action(state)
-            else:
-                if self.num_repeat == 1:
-                    print("White's turn\n")
-                move = self.white_agent.get_action(state)
+            if self.num_repeat == 1:
+                print("Black's turn\n" if state.turn() == State.BLACK else "White's turn\n")
+
+            move = self.get_move(state)
+            if move == OUT_OF_TIME:
+                return self.end_game_command_line(state, forfeited=True)
             
             state = state.place_disk(move)
 
+            if state.passed and self.num_repeat == 1:
+                print("White has no valid moves and passes\n" if state.turn() == State.BLACK else "Black has no valid moves and passes\n")
+
             if self.slow:
                 sleep(1) # sleep for 1 second
         
@@ -87,11 +291,17 @@ class Main:
 
         return self.end_game_command_line(state)
         
-    def end_game_command_line(self, state: State) -> int:
+    # If the player to move forfeited the game by running out of time, their opponent wins
+    def end_game_command_line(self, state: State, forfeited: bool = False) -> int:
         if self.num_repeat == 1:
             print("Game over.")
 
         winner = state.winner()
+        if forfeited:
+            winner = State.WHITE if state.turn() == State.BLACK else State.BLACK
+            if self.num_repeat == 1:
+                print("Black ran out of time" if winner == State.WHITE else "White ran out of time")
+
         if winner == State.BLACK:
             if self.num_repeat == 1:
                 print("Black wins!")
@@ -109,34 +319,40 @@ class Main:
         pygame.display.set_caption('Reversi')
 
         clock = pygame.time.Clock()
-        state = State(window=window)
+        renderer = Renderer(window)
+        state = State()
 
-        state.repaint()
+        renderer.repaint(state)
         sleep(2)
 
         while not state.game_over():
             clock.tick(60)
 
-            curr_agent = self.black_agent if state.turn() == state.BLACK else self.white_agent
-            move = curr_agent.get_action(state)
+            move = self.get_move(state)
 
             if move == NO_MOVE or move is None:
                 continue
             if move == QUIT_GAME:
                 return
+            if move == OUT_OF_TIME:
+                return self.end_game_gui(state, forfeited=True)
 
             state = state.place_disk(move)
-            state.repaint()
+            renderer.repaint(state)
             sleep(2)
         
         return self.end_game_gui(state)
         
-    def end_game_gui(self, state: State) -> int:
-        if not state.game_over():
+    # If the player to move forfeited the game by running out of time, their opponent wins
+    def end_game_gui(self, state: State, forfeited: bool = False) -> int:
+        winner = state.winner()
+        if forfeited:
+            winner = State.WHITE if state.turn() == State.BLACK else State.BLACK
+            print("Black ran out of time" if winner == State.WHITE else "White ran out of time")
+        elif not state.game_over():
             print("Game interrupted")
 
         print("Game over.")
-        winner = state.winner()
         if winner == State.BLACK:
             print("Black wins!")
         elif winner == State.WHITE:
@@ -149,16 +365,61 @@ class Main:
 
         return winner
 
+    # Minimax options are passed to the MinimaxAgent constructor as keyword arguments
+    # If an opening book path is given, every computer agent plays from the book when it can
+    # If evaluation_cache is positive, the evaluation function of every minimax agent caches up to that many
+    # evaluations; agents that play the best move by their evaluation function evaluate each position once, so they
+    # are left alone
+    @staticmethod
+    def get_agents(black_agent_args: List[str], white_agent_args: List[str], minimax_options: Optional[Dict[str, Any]] = None,
+                   book_path: Optional[str] = None, evaluation_cache: int = 0) -> Tuple[Agent]:
+        minimax_options = {} if minimax_options is None else minimax_options
+        return (Main.get_agent(black_agent_args, minimax_options, book_path, evaluation_cache),
+                Main.get_agent(white_agent_args, minimax_options, book_path, evaluation_cache))
+
     @staticmethod
-    def get_agents(black_agent_args: List[str], white_agent_args: List[str]) -> Tuple[Agent]:
-        return Main.get_agent(black_agent_args), Main.get_agent(white_agent_args)
+    def get_agent(agent_args: List[str], minimax_options: Optional[Dict[str, Any]] = None, book_path: Optional[str] = None,
+                  evaluation_cache: int = 0) -> Agent:
+        minimax_options = {} if minimax_options is None else minimax_options
+        agent = Main.get_base_agent(agent_args, minimax_options, evaluation_cache)
+
+        if book_path is not None and agent_args[0] != 'manual':
+            return BookAgent(agent, OpeningBook(book_path))
+
+        return agent
 
     @staticmethod
-    def get_agent(agent_args: List[str]) -> Agent:
+    def get_base_agent(agent_args: List[str], minimax_options: Optional[Dict[str, Any]] = None, evaluation_cache: int = 0) -> Agent:
+        minimax_options = {} if minimax_options is None else minimax_options
         if agent_args[0] == 'minimax':
-            return MinimaxAgent(AGENT_CHOICES[agent_args[1]](), int(agent_args[2]))
+            depth = int(agent_args[2]) if len(agent_args) > 2 else None
+            evaluator = Main.get_evaluator(agent_args[1], evaluation_cache)
+            options = dict(minimax_options)
+            workers = options.pop('workers', 1)
+            ponder = options.pop('ponder', False)
+            if workers > 1:
+                return ParallelMinimaxAgent(evaluator, depth, workers=workers, **options)
+            agent = MinimaxAgent(evaluator, depth, **options)
+            return PonderingAgent(agent) if ponder else agent
         
-        return AGENT_CHOICES[(agent_args[0])]()
+        if agent_args[0] == 'mcts':
+            time_limit = minimax_options.get('time_limit')
+            if len(agent_args) > 1:
+                playouts = int(agent_args[1])
+            else:
+                playouts = None if time_limit is not None else MCTSAgent.DEFAULT_PLAYOUTS
+            return MCTSAgent(playouts, time_limit, policy=agent_args[2] if len(agent_args) > 2 else RANDOM)
+
+        return AGENT_CHOICES[agent_args[0]]()
+
+    @staticmethod
+    def get_evaluator(name: str, evaluation_cache: int = 0) -> Agent:
+        agent = AGENT_CHOICES[name]()
+
+        if evaluation_cache > 0:
+            return CachedAgent(agent, evaluation_cache)
+
+        return agent
 
 # Allows the user to play a complete game of Reversi through standard in/out
 if __name__ == '__main__':
@@ -168,11 +429,47 @@ if __name__ == '__main__':
     parser.add_argument('-r', '--repeat', type = int, default = 1)
     parser.add_argument('-i', '--interactive', action = 'store_true')
     parser.add_argument('-s', '--slow', action = 'store_true')
+    parser.add_argument('-t', '--time', type = float, default = None)
+    parser.add_argument('--table-memory', type = float, default = 16)
+    parser.add_argument('--workers', type = int, default = 1)
+    parser.add_argument('--endgame', type = int, nargs = '?', const = 14, default = 0)
+    parser.add_argument('--search', choices = ALGORITHMS, default = ALPHA_BETA)
+    parser.add_argument('--probcut', default = None)
+    parser.add_argument('-j', '--jobs', type = int, default = 1)
+    parser.add_argument('--seed', type = int, default = None)
+    parser.add_argument('--book', default = None)
+    parser.add_argument('--eval-cache', type = int, default = 0)
+    parser.add_argument('--stats', default = None)
+    parser.add_argument('--ponder', action = 'store_true')
+    parser.add_argument('--clock', type = float, default = None)
+    parser.add_argument('--increment', type = float, default = 0)
+    parser.add_argument('--overrun', choices = OVERRUN_POLICIES, default = FORFEIT)
 
     args = parser.parse_args()
+    if args.clock is not None and args.clock <= 0:
+        parser.error('--clock must be a positive number of seconds')
+    if args.increment < 0:
+        parser.error('--increment must not be negative')
+
+    agent_args = {
+        'black_agent_args': args.black,
+        'white_agent_args': args.white,
+        'minimax_options': {'table_memory': args.table_memory, 'time_limit': args.time,
+                            'endgame_empties': args.endgame, 'algorithm': args.search,
+                            'probcut': None if args.probcut is None else ProbCut.load(args.probcut), 'workers': args.workers,
+                            'ponder': args.ponder},
+        'book_path': args.book,
+        'evaluation_cache': args.eval_cache,
+    }
 
-    black_agent, white_agent = Main.get_agents(args.black, args.white)
+    black_agent, white_agent = Main.get_agents(**agent_args)
 
-    main = Main(black_agent, white_agent, args.repeat, args.slow)
+    try:
+        main = Main(black_agent, white_agent, args.repeat, args.slow, args.jobs, args.seed, agent_args, args.stats,
+                    None if args.clock is None else TimeControl(args.clock, args.increment, args.overrun))
+    except ValueError as error:
+        black_agent.close()
+        white_agent.close()
+        parser.error(str(error))
 
     main.run_game(args.interactive)
@@ -0,0 +1,307 @@
+import math
+import random
+import time
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+import bitboard
+import encoding
+from agents import Agent
+from features import POSITIONAL_WEIGHTS, count_bits
+from instrumentation import SearchInstruments
+from model import Coordinate, State
+
+# Playout policies: uniformly random moves, or moves drawn with probability proportional to
+# exp(positional weight / POSITIONAL_TEMPERATURE), which favours corners and avoids the cells next to them
+RANDOM = 'random'
+POSITIONAL = 'positional'
+POLICIES = (RANDOM, POSITIONAL)
+POSITIONAL_TEMPERATURE = 50
+
+ONE = np.uint64(1)
+MIN_SAMPLE = np.float32(1e-30)
+
+
+# A position in the search tree, with the statistics of the playouts that went through it
+# Positions are kept as bitboards rather than states so expanding a node costs a single move generation
+class Node:
+    __slots__ = ('black', 'white', 'black_to_move', 'parent', 'action', 'untried', 'children', 'visits', 'wins')
+
+    # Creates the node of the position, passing the turn if the player to move has no moves
+    def __init__(self, black: int, white: int, black_to_move: bool, parent: Optional["Node"] = None,
+                 action: Optional[Coordinate] = None) -> None:
+        player, opponent = (black, white) if black_to_move else (white, black)
+        moves = bitboard.get_moves(player, opponent)
+        if not moves:
+            moves = bitboard.get_moves(opponent, player)
+            if moves:
+                black_to_move = not black_to_move
+
+        self.black = black
+        self.white = white
+        self.black_to_move = black_to_move
+        self.parent = parent
+        self.action = action
+
+        # Valid moves that have no child yet, as a bitboard
+        self.untried = moves
+        self.children: List[Node] = []
+
+        # Playouts through this node, including those still running, and their results for the player who
+        # moved into it: 1 for a win and 0.5 for a tie
+        self.visits = 0
+        self.wins = 0.0
+
+    def is_terminal(self) -> bool:
+        return not self.untried and not self.children
+
+    # Plays the move on the position and adds the resulting node as a child
+    def expand(self, move: int) -> "Node":
+        if self.black_to_move:
+            flips = bitboard.get_flips(self.black, self.white, move)
+            black, white = self.black | move | flips, self.white ^ flips
+        else:
+            flips = bitboard.get_flips(self.white, self.black, move)
+            black, white = self.black ^ flips, self.white | move | flips
+
+        self.untried ^= move
+        child = Node(black, white, not self.black_to_move, self, divmod(move.bit_length() - 1, State.SIZE))
+        self.children.append(child)
+        return child
+
+    # Returns the child with the highest upper confidence bound (UCT)
+    def select(self, exploration: float) -> "Node":
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.wins / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+    def matches(self, state: State) -> bool:
+        return self.black == state.black and self.white == state.white and \
+            self.black_to_move == (state.turn() == State.BLACK)
+
+
+# Plays every game in the arrays out to the end with moves drawn by the policy, and returns the final disk
+# differential of each from black's point of view
+# All games advance one move per step using the vectorized move generator, and finished games are dropped
+def playout(black: np.ndarray, white: np.ndarray, black_to_move: np.ndarray, rng: np.random.Generator,
+            weights: Optional[np.ndarray] = None) -> np.ndarray:
+    player = np.where(black_to_move, black, white)
+    opponent = np.where(black_to_move, white, black)
+    black_to_move = black_to_move.copy()
+    games = np.arange(len(black))
+    differentials = np.zeros(len(black), dtype=np.int64)
+
+    while len(games):
+        moves = encoding.get_moves(player, opponent)
+
+        stuck = np.flatnonzero(moves == 0)
+        if len(stuck):
+            opponent_moves = encoding.get_moves(opponent[stuck], player[stuck])
+
+            # The game is over when neither player can move
+            over = stuck[opponent_moves == 0]
+            if len(over):
+                final_black = np.where(black_to_move[over], player[over], opponent[over])
+                final_white = np.where(black_to_move[over], opponent[over], player[over])
+                differentials[games[over]] = count_bits(final_black) - count_bits(final_white)
+
+            # Otherwise the player to move passes
+            passing = stuck[opponent_moves != 0]
+            player[passing], opponent[passing] = opponent[passing], player[passing]
+            black_to_move[passing] = ~black_to_move[passing]
+            moves[passing] = opponent_moves[opponent_moves != 0]
+
+            if len(over):
+                playing = moves != 0
+                games, player, opponent, black_to_move, moves = \
+                    games[playing], player[playing], opponent[playing], black_to_move[playing], moves[playing]
+                if not len(games):
+                    break
+
+        move = choose_moves(moves, rng, weights)
+        flips = encoding.get_flips(player, opponent, move)
+        player, opponent = opponent ^ flips, player | move | flips
+        black_to_move = ~black_to_move
+
+    return differentials
+
+
+# Returns one of the valid moves of each position as a single bit, drawn with probability proportional to the given
+# weight of its cell, or uniformly if there are none
+def choose_moves(moves: np.ndarray, rng: np.random.Generator, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    valid = encoding.to_planes(moves).reshape(len(moves), -1)
+
+    # The valid cell with the highest random number wins; random bytes are much cheaper to draw than floats,
+    # and the lowest bit is set so that every valid cell scores above the invalid ones
+    if weights is None:
+        scores = (np.frombuffer(rng.bytes(valid.size * 2), dtype=np.uint16).reshape(valid.shape) | 1) * valid
+        return ONE << np.argmax(scores, axis=1).astype(np.uint64)
+
+    # The valid cell whose weight divided by an exponential sample is highest is drawn with probability
+    # proportional to its weight; samples are kept away from 0 so that invalid cells score 0 rather than NaN
+    samples = np.maximum(rng.standard_exponential(size=valid.shape, dtype=np.float32), MIN_SAMPLE)
+    scores = weights / samples * valid
+    return ONE << np.argmax(scores, axis=1).astype(np.uint64)
+
+
+# Agent that chooses moves by Monte Carlo tree search, growing a tree of positions by UCT selection and scoring
+# new positions with playouts to the end of the game
+# Playouts run in batches: batch_size leaves are selected in turn, each counted as visited so the next selection
+# prefers other branches, and then all of them are played out leaf_playouts times at once, which keeps the
+# vectorized playouts busy enough to run about 15,000 uniform playouts per second
+# The search stops after the given number of playouts, or after time_limit milliseconds, whichever comes first
+# The subtree of the position reached on the next turn is kept rather than searched again
+class MCTSAgent(Agent):
+    DEFAULT_PLAYOUTS = 10000
+
+    def __init__(self, playouts: Optional[int] = DEFAULT_PLAYOUTS, time_limit: Optional[float] = None,
+                 exploration: float = math.sqrt(2), batch_size: int = 64, leaf_playouts: int = 16,
+                 policy: str = RANDOM) -> None:
+        if playouts is None and time_limit is None:
+            raise ValueError("An MCTS agent needs a number of playouts, a time limit or both")
+        if playouts is not None and playouts <= 0:
+            raise ValueError(f"An MCTS agent needs a positive number of playouts, got {playouts}")
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown playout policy {policy}, expected one of {', '.join(POLICIES)}")
+
+        self.playouts = playouts
+        self.time_limit = time_limit
+        self.exploration = exploration
+        self.batch_size = batch_size
+        self.leaf_playouts = leaf_playouts
+        self.policy = policy
+        self.weights = None
+        if policy == POSITIONAL:
+            self.weights = np.exp(np.asarray(POSITIONAL_WEIGHTS, dtype=np.float32).reshape(-1) / POSITIONAL_TEMPERATURE)
+
+        # The subtree of the move played last, searched again on the next turn
+        self.root = None
+
+        self.total_playouts = 0
+        self.reuse_hits = 0
+        self.reuse_misses = 0
+
+        # Per-move statistics, collected once the agent is instrumented
+        self.instruments = None
+
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        if state.game_over():
+            return None
+
+        root = self.find_subtree(state)
+        if root is None:
+            root = Node(state.black, state.white, state.turn() == State.BLACK)
+
+        if self.time_limit is not None:
+            time_limit_deadline = time.perf_counter() + self.time_limit / 1000
+            deadline = time_limit_deadline if deadline is None else min(deadline, time_limit_deadline)
+
+        if self.instruments is None:
+            self.search(root, deadline)
+        else:
+            playouts = self.total_playouts
+            start_time = time.perf_counter()
+            self.search(root, deadline)
+            self.instruments.record({'time': time.perf_counter() - start_time,
+                                     'playouts': self.total_playouts - playouts})
+
+        # A search stopped before its first batch leaves the root unexpanded, so any valid move is played
+        if not root.children:
+            self.root = None
+            return random.choice(state.valid_moves())
+
+        best_child = max(root.children, key=lambda child: child.visits)
+        best_child.parent = None
+        self.root = best_child
+        return best_child.action
+
+    # Returns the node of the state among the positions reached from the previous turn's move, or None
+    def find_subtree(self, state: State) -> Optional[Node]:
+        if self.root is not None:
+            for node in [self.root] + self.root.children:
+                if node.matches(state):
+                    node.parent = None
+                    self.reuse_hits += 1
+                    return node
+
+        self.reuse_misses += 1
+        return None
+
+    # Runs playouts from the root until the number of playouts is reached or the deadline passes
+    def search(self, root: Node, deadline: Optional[float] = None) -> None:
+        rng = np.random.default_rng(random.getrandbits(64))
+        playouts = 0
+
+        while self.playouts is None or playouts < self.playouts:
+            batch_size = self.batch_size
+            if self.playouts is not None:
+                batch_size = min(batch_size, -(-(self.playouts - playouts) // self.leaf_playouts))
+
+            leaves = [self.select_leaf(root) for _ in range(batch_size)]
+            self.play_out(leaves, rng)
+            playouts += batch_size * self.leaf_playouts
+
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+
+        self.total_playouts += playouts
+
+    # Walks down the tree by UCT and expands one untried move, counting the playouts of the leaf as visits to
+    # every node on the way
+    def select_leaf(self, root: Node) -> Node:
+        node = root
+        node.visits += self.leaf_playouts
+
+        while not node.untried and node.children:
+            node = node.select(self.exploration)
+            node.visits += self.leaf_playouts
+
+        if node.untried:
+            moves = bitboard.iterate_bits(node.untried)
+            node = node.expand(1 << random.choice(moves))
+            node.visits += self.leaf_playouts
+
+        return node
+
+    # Plays out the positions of the leaves and adds the results to every node from each leaf up to the root
+    def play_out(self, leaves: List[Node], rng: np.random.Generator) -> None:
+        black = np.fromiter((leaf.black for leaf in leaves), dtype=np.uint64, count=len(leaves))
+        white = np.fromiter((leaf.white for leaf in leaves), dtype=np.uint64, count=len(leaves))
+        black_to_move = np.fromiter((leaf.black_to_move for leaf in leaves), dtype=bool, count=len(leaves))
+
+        differentials = playout(np.repeat(black, self.leaf_playouts), np.repeat(white, self.leaf_playouts),
+                                np.repeat(black_to_move, self.leaf_playouts), rng, self.weights)
+        differentials = differentials.reshape(len(leaves), self.leaf_playouts)
+        black_wins = (differentials > 0).sum(axis=1) + (differentials == 0).sum(axis=1) / 2
+
+        for leaf, black_result in zip(leaves, black_wins.tolist()):
+            white_result = self.leaf_playouts - black_result
+
+            node = leaf
+            while node.parent is not None:
+                node.wins += black_result if node.parent.black_to_move else white_result
+                node = node.parent
+
+    # Records the playouts and time of each move from now on
+    def instrument(self) -> None:
+        if self.instruments is None:
+            self.instruments = SearchInstruments()
+
+    def take_move_records(self) -> List[Dict[str, float]]:
+        return [] if self.instruments is None else self.instruments.take_records()
+
+    def statistics(self) -> Dict[str, float]:
+        return {'playouts': self.total_playouts, 'tree_reuse_hits': self.reuse_hits,
+                'tree_reuse_misses': self.reuse_misses}
+
+    def __str__(self) -> str:
+        if self.time_limit is None:
+            description = f"MCTS, {self.playouts} playouts"
+        elif self.playouts is None:
+            description = f"MCTS, {self.time_limit:g} ms"
+        else:
+            description = f"MCTS, {self.playouts} playouts, {self.time_limit:g} ms"
+
+        if self.policy != RANDOM:
+            description += f", {self.policy} playouts"
+        return description
@@ -1,49 +1,507 @@
 import math
-from typing import Tuple
+import time
+from typing import Dict, List, Optional, Tuple
 from agents import Agent
-from model import Coordinate, State
+from endgame import EndgameSolver, SolverTimeout
+from instrumentation import SearchInstruments, TimedSearchState
+from model import Coordinate, SearchState, State
+from probcut import Cut, ProbCut
+from transposition import EXACT, LOWER, UPPER, TranspositionTable
+
+# Raised inside the search when the time budget for a move runs out
+class SearchTimeout(Exception):
+    pass
+
+# Search algorithms a minimax agent can use, all built on the same negamax search
+# alphabeta searches every node with the full window, pvs searches every move after the first at a node with a
+# null window and only re-searches moves that turn out better, and mtdf finds the value with a sequence of null
+# window searches from the root, relying on the transposition table to avoid searching nodes again
+ALPHA_BETA = 'alphabeta'
+PVS = 'pvs'
+MTDF = 'mtdf'
+ALGORITHMS = (ALPHA_BETA, PVS, MTDF)
 
 # A minimax agent with alpha-beta pruning
 class MinimaxAgent(Agent):
+    # Number of nodes searched between checks of the clock
+    CLOCK_CHECK_INTERVAL = 1024
+
+    # Width of the null windows of PVS and MTD(f), the smallest difference between two utilities
+    # Evaluation functions with finer utilities still give the same results, with more re-searches
+    NULL_WINDOW = 1
+
     # Creates a new minimax agent with the given evaluation function agent and game tree traversal depth
-    def __init__(self, agent: Agent, depth: int):
+    # Searched positions are cached in a transposition table of at most table_memory megabytes (0 disables it)
+    # If a time limit in milliseconds is given, the agent deepens iteratively until the time runs out, and depth
+    # (which may then be None) is only an upper bound
+    # With endgame_empties or fewer empty cells left, the agent solves the rest of the game exactly instead
+    # The algorithm is one of ALGORITHMS; MTD(f) needs the transposition table
+    # With ProbCut parameters fitted for the evaluation function, nodes that are very likely outside the window are
+    # cut after a shallow search, which makes the search selective but much faster
+    def __init__(self, agent: Agent, depth: Optional[int], table_memory: float = 16, time_limit: Optional[float] = None,
+                 endgame_empties: int = 0, algorithm: str = ALPHA_BETA, probcut: Optional[ProbCut] = None):
+        if depth is None and time_limit is None:
+            raise ValueError("A minimax agent needs a depth, a time limit or both")
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown search algorithm {algorithm}, expected one of {', '.join(ALGORITHMS)}")
+        if algorithm == MTDF and table_memory <= 0:
+            raise ValueError("MTD(f) needs a transposition table")
+
         self.agent = agent
         self.depth = depth
+        self.time_limit = time_limit
+        self.table = TranspositionTable(table_memory) if table_memory > 0 else None
+        self.endgame_empties = endgame_empties
+        self.algorithm = algorithm
+        self.probcut = probcut
+        self.solver = EndgameSolver()
+
+        # Depth of the current iteration and deadline of the current move
+        self.search_depth = depth
+        self.deadline = None
+        self.nodes = 0
+
+        # Node count at which the clock is checked next; batched evaluation adds several nodes at once, so the count
+        # may jump past any given multiple of the interval
+        self.next_clock_check = MinimaxAgent.CLOCK_CHECK_INTERVAL
+
+        # Nodes whose moves were searched, their total number of moves, and how many of them were cut off,
+        # after the first move or after a later one
+        self.interior_nodes = 0
+        self.branches = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+        # Per-move statistics, collected once the agent is instrumented
+        self.instruments = None
+
+        # Number of ProbCut shallow searches and of nodes they cut
+        self.probcut_tries = 0
+        self.probcut_cuts = 0
+
+        # Move ordering heuristics: the previous iteration's principal variation, two killer moves
+        # per ply and history scores per player and cell
+        self.principal_variation = []
+        self.follow_pv = False
+        self.pv_table = []
+        self.killers = []
+        self.history = []
+
+        # Depth of the last completed iteration of the last search and its minimax value
+        self.depth_reached = 0
+        self.score = None
+
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        if self.instruments is None:
+            return self.choose_action(state, deadline)
+
+        action, counters = self.measure_action(state, deadline)
+        self.instruments.record(counters)
+        return action
+
+    # Chooses the action as choose_action does and returns it with the counters of the search behind it, which the
+    # instruments record once the move is played
+    # The phase times of the search are left in the instruments until the next search starts
+    def measure_action(self, state: State, deadline: Optional[float] = None) -> Tuple[Coordinate, Dict[str, float]]:
+        table_hits, table_misses = (0, 0) if self.table is None else (self.table.hits, self.table.misses)
+        statistics = self.statistics()
+        self.instruments.start_move()
+        start_time = time.perf_counter()
+
+        action = self.choose_action(state, deadline)
+
+        counters = {'time': time.perf_counter() - start_time, 'nodes': self.nodes, 'depth': self.depth_reached,
+                    'interior_nodes': self.interior_nodes, 'branches': self.branches, 'cutoffs': self.cutoffs,
+                    'first_move_cutoffs': self.first_move_cutoffs}
+        if self.table is not None:
+            counters['table_hits'] = self.table.hits - table_hits
+            counters['table_misses'] = self.table.misses - table_misses
+        for key, value in self.statistics().items():
+            counters[key] = value - statistics.get(key, 0)
+
+        return action, counters
+
+    # Times the phases of every search from now on and records the statistics of each move
+    def instrument(self) -> None:
+        if self.instruments is not None:
+            return
+
+        self.instruments = SearchInstruments()
+        self.order_moves = self.instruments.timed('move_generation', self.order_moves)
+        self.evaluate = self.instruments.timed('evaluate', self.evaluate)
+        self.evaluate_frontier = self.instruments.timed('evaluate', self.evaluate_frontier)
+
+    def take_move_records(self) -> List[Dict[str, float]]:
+        return [] if self.instruments is None else self.instruments.take_records()
+
+    # Searches the state and returns the action to play
+    # A deadline shortens the time limit to the time left until it, and makes a fixed depth search deepen
+    # iteratively so that it can stop in time
+    def choose_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        time_limit = self.time_limit
+        if deadline is not None:
+            time_left = max(0.0, deadline - time.perf_counter()) * 1000
+            time_limit = time_left if time_limit is None else min(time_limit, time_left)
 
-    def get_action(self, state: State) -> Coordinate:
-        return self.get_action_helper(state, state.turn() == State.BLACK, 0, -math.inf, math.inf)[0]
-    
-    def get_action_helper(self, state: State, maximize: bool, depth: int, alpha: int, beta: int) -> Tuple[Coordinate, int]:
-        if depth == self.depth or state.game_over():
-            return self.agent.get_action(state), self.evaluate(state)
-        
-        if maximize:
-            max_utility = -math.inf
-            max_action = None
-            for action in state.valid_moves():
-                successor_utility = self.get_action_helper(state.place_disk(action), False, depth + 1, alpha, beta)[1]
-                if successor_utility > max_utility:
-                    max_utility = successor_utility
-                    max_action = action
-                alpha = max(alpha, max_utility)
-                if alpha > beta:
-                    break
-            return max_action, max_utility
+        # The counters are reset before a depth 0 search too, so that its move is recorded as searching no nodes
+        self.prepare_search(time_limit)
+        self.depth_reached = 0
+
+        if self.depth == 0:
+            return self.agent.get_action(state, deadline)
+
+        # The search makes and undoes moves in place on a private copy of the state
+        state = SearchState(state) if self.instruments is None else TimedSearchState(state, self.instruments)
+        empty_cells = State.SIZE * State.SIZE - state.black_disks() - state.white_disks()
+
+        if empty_cells <= self.endgame_empties:
+            action = self.solve_endgame(state, empty_cells, time_limit)
+            if action is not None:
+                return action
+
+        if time_limit is None:
+            self.search_depth = self.depth
+            self.depth_reached = self.depth
+            return self.search_root(state)
+
+        start_time = time.perf_counter()
+
+        max_depth = empty_cells if self.depth is None else min(self.depth, empty_cells)
+
+        best_action = None
+        for search_depth in range(1, max_depth + 1):
+            self.search_depth = search_depth
+            try:
+                action = self.search_root(state)
+            except SearchTimeout:
+                break
+
+            best_action = action
+            self.depth_reached = search_depth
+
+            # The next iteration would almost certainly not finish in the remaining time
+            if time.perf_counter() - start_time > time_limit / 2000:
+                break
+
+        return best_action
+
+    # Makes a search running in another thread stop at its next clock check, as if its time had run out
+    # A search started after the call is not affected
+    def stop(self) -> None:
+        self.deadline = -math.inf
+        self.solver.deadline = -math.inf
+
+    # Resets the per-move search state and sets the deadline to time_limit milliseconds from now, if given
+    def prepare_search(self, time_limit: Optional[float]) -> None:
+        if self.table is not None:
+            self.table.new_search()
+
+        self.nodes = 0
+        self.next_clock_check = MinimaxAgent.CLOCK_CHECK_INTERVAL
+        self.interior_nodes = 0
+        self.branches = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.principal_variation = []
+        self.killers = [[None, None] for _ in range(State.SIZE * State.SIZE + 1)]
+        self.history = [None, [0] * (State.SIZE * State.SIZE), [0] * (State.SIZE * State.SIZE)]
+        self.deadline = None if time_limit is None else time.perf_counter() + time_limit / 1000
+
+    # Returns the move with the best final disk differential under perfect play, setting the score to that
+    # differential from black's point of view
+    # With a time limit, the solver gets half of it and None is returned if it does not finish
+    def solve_endgame(self, state: State, empty_cells: int, time_limit: Optional[float]) -> Optional[Coordinate]:
+        deadline = None if time_limit is None else time.perf_counter() + time_limit / 2000
+        player, opponent = state.players()
+
+        try:
+            move, score = self.solver.solve(player, opponent, deadline)
+        except SolverTimeout:
+            return None
+        finally:
+            self.nodes += self.solver.nodes
+
+        if move is None:
+            return None
+
+        action = divmod(move.bit_length() - 1, State.SIZE)
+        self.score = score if state.turn() == State.BLACK else -score
+        self.depth_reached = empty_cells
+        self.principal_variation = [action]
+        return action
+
+    # Searches the state to the current search depth within the given window and returns the best action
+    # The window and the score are from black's point of view
+    def search_root(self, state: State, alpha: float = -math.inf, beta: float = math.inf) -> Coordinate:
+        self.follow_pv = True
+        self.pv_table = [[] for _ in range(self.search_depth + 1)]
+
+        black_to_move = state.turn() == State.BLACK
+        if not black_to_move:
+            alpha, beta = -beta, -alpha
+
+        if self.algorithm == MTDF:
+            guess = None if self.score is None else (self.score if black_to_move else -self.score)
+            action, score = self.mtdf(state, 0, alpha, beta, guess)
         else:
-            min_utility = math.inf
-            min_action = None
-            for action in state.valid_moves():
-                successor_utility = self.get_action_helper(state.place_disk(action), True, depth + 1, alpha, beta)[1]
-                if successor_utility < min_utility:
-                    min_utility = successor_utility
-                    min_action = action
-                beta = min(beta, min_utility)
-                if beta < alpha:
-                    break
-            return min_action, min_utility
-    
+            action, score = self.negamax(state, 0, alpha, beta)
+
+        self.score = score if black_to_move else -score
+        self.principal_variation = self.pv_table[0]
+        return action
+
+    # Searches the state reached by playing the action at the root, as the search from the root would search it
+    # at the current search depth, and returns its score
+    # The window, the score and the guess of the score for MTD(f) (or None) are from black's point of view
+    # The principal variation is set to the action followed by the best line after it
+    def search_move(self, state: SearchState, action: Coordinate, alpha: float, beta: float,
+                    guess: Optional[float] = None) -> float:
+        self.pv_table = [[] for _ in range(self.search_depth + 1)]
+
+        state.make_move(action)
+        try:
+            black_to_move = state.turn() == State.BLACK
+            if not black_to_move:
+                alpha, beta = -beta, -alpha
+                guess = None if guess is None else -guess
+
+            if self.algorithm == MTDF:
+                score = self.mtdf(state, 1, alpha, beta, guess)[1]
+            else:
+                score = self.negamax(state, 1, alpha, beta)[1]
+        finally:
+            state.undo_move()
+
+        self.principal_variation = [action] + self.pv_table[1]
+        return score if black_to_move else -score
+
+    # Finds the value of the state at the given ply with null window searches that narrow a lower and an upper
+    # bound around it, starting from the guess (or the evaluation of the state), and stops early once the value is
+    # known to be outside the window
+    # The window, the guess and the returned score are from the point of view of the player to move
+    def mtdf(self, state: State, depth: int, alpha: float, beta: float,
+             guess: Optional[float] = None) -> Tuple[Coordinate, float]:
+        score = self.evaluate_for_player(state) if guess is None else guess
+        lower, upper = -math.inf, math.inf
+        best_action, principal_variation = None, []
+
+        while lower < upper and upper > alpha and lower < beta:
+            test = score + MinimaxAgent.NULL_WINDOW if score == lower else score
+            self.follow_pv = True
+            action, score = self.negamax(state, depth, test - MinimaxAgent.NULL_WINDOW, test)
+
+            # A search that fails high proves its action reaches the new lower bound
+            if score < test:
+                upper = score
+            else:
+                lower = score
+                best_action, principal_variation = action, self.pv_table[depth]
+
+            if best_action is None:
+                best_action = action
+
+        self.pv_table[depth] = principal_variation
+        return best_action, score
+
+    # Searches the state within the window, from the point of view of the player to move
+    # The returned score may lie outside the window: a score at most alpha is an upper bound on the value of the
+    # state, a score at least beta is a lower bound, and any other score is exact
+    # After a pass, the same player moves twice in a row, and the score of the next state is not negated
+    def negamax(self, state: State, depth: int, alpha: float, beta: float) -> Tuple[Coordinate, float]:
+        self.nodes += 1
+        if self.deadline is not None and self.nodes >= self.next_clock_check and self.search_depth > 1:
+            self.next_clock_check = self.nodes + MinimaxAgent.CLOCK_CHECK_INTERVAL
+            if time.perf_counter() > self.deadline:
+                raise SearchTimeout()
+
+        self.pv_table[depth] = []
+
+        if depth == self.search_depth or state.game_over():
+            return None, self.evaluate_for_player(state)
+
+        turn = state.turn()
+        remaining_depth = self.search_depth - depth
+        original_alpha, original_beta = alpha, beta
+        table_action = None
+
+        if self.table is not None:
+            entry = self.table.lookup(state.zobrist_key)
+            if entry is not None:
+                if entry.depth >= remaining_depth:
+                    if entry.bound == EXACT:
+                        return entry.move, entry.score
+                    if entry.bound == LOWER:
+                        alpha = max(alpha, entry.score)
+                    elif entry.bound == UPPER:
+                        beta = min(beta, entry.score)
+                    if alpha >= beta:
+                        return entry.move, entry.score
+                table_action = entry.move
+
+        if self.probcut is not None and depth > 0:
+            empty_cells = State.SIZE * State.SIZE - state.black_disks() - state.white_disks()
+            for cut in self.probcut.lookup(remaining_depth, empty_cells):
+                score = self.try_probcut(state, depth, cut, alpha, beta)
+                if score is not None:
+                    return None, score
+
+        actions = self.order_moves(state, depth, table_action)
+        history = self.history[turn]
+        self.interior_nodes += 1
+        self.branches += len(actions)
+
+        if remaining_depth == 1 and self.agent.batch_evaluation:
+            best_action, best_score = self.evaluate_frontier(state, turn, actions)
+            self.pv_table[depth] = [best_action]
+            if self.table is not None:
+                self.table.store(state.zobrist_key, remaining_depth, EXACT, best_action, best_score)
+            return best_action, best_score
+
+        best_action, best_score = None, -math.inf
+        for action in actions:
+            state.make_move(action)
+            if self.algorithm == PVS and best_action is not None:
+                score = self.search_successor(state, turn, depth, alpha, alpha + MinimaxAgent.NULL_WINDOW)
+                if alpha < score < beta:
+                    score = self.search_successor(state, turn, depth, alpha, beta)
+            else:
+                score = self.search_successor(state, turn, depth, alpha, beta)
+            state.undo_move()
+            self.follow_pv = False
+
+            if score > best_score:
+                best_action, best_score = action, score
+                self.pv_table[depth] = [action] + self.pv_table[depth + 1]
+            alpha = max(alpha, best_score)
+            if alpha >= beta:
+                if action == actions[0]:
+                    self.first_move_cutoffs += 1
+                self.record_cutoff(history, action, depth, remaining_depth)
+                break
+
+        if self.table is not None:
+            if best_score <= original_alpha:
+                bound = UPPER
+            elif best_score >= original_beta:
+                bound = LOWER
+            else:
+                bound = EXACT
+            self.table.store(state.zobrist_key, remaining_depth, bound, best_action, best_score)
+
+        return best_action, best_score
+
+    # Searches the state to the shallow depth of the cut with a null window at the bound its prediction of the deep
+    # score must cross to be outside the window with high probability
+    # Returns beta or alpha if the node can be cut, and None otherwise
+    def try_probcut(self, state: State, depth: int, cut: Cut, alpha: float, beta: float) -> Optional[float]:
+        margin = self.probcut.threshold * cut.error
+        search_depth = self.search_depth
+        self.search_depth = depth + cut.shallow_depth
+        self.probcut_tries += 1
+
+        try:
+            if beta < math.inf:
+                bound = (beta + margin - cut.intercept) / cut.slope
+                if self.negamax(state, depth, bound - MinimaxAgent.NULL_WINDOW, bound)[1] >= bound:
+                    self.probcut_cuts += 1
+                    return beta
+
+            if alpha > -math.inf:
+                bound = (alpha - margin - cut.intercept) / cut.slope
+                if self.negamax(state, depth, bound, bound + MinimaxAgent.NULL_WINDOW)[1] <= bound:
+                    self.probcut_cuts += 1
+                    return alpha
+        finally:
+            self.search_depth = search_depth
+
+        return None
+
+    # Searches the state reached by a move of the given player within the window, from that player's point of view
+    def search_successor(self, state: State, turn: int, depth: int, alpha: float, beta: float) -> float:
+        if state.turn() == turn:
+            return self.negamax(state, depth + 1, alpha, beta)[1]
+        return -self.negamax(state, depth + 1, -beta, -alpha)[1]
+
+    # Evaluates every successor of a node one ply above the search depth in a single batch
+    # Returns the best action and its score for the given player to move, preferring earlier actions on ties
+    def evaluate_frontier(self, state: State, turn: int, actions: List[Coordinate]) -> Tuple[Coordinate, float]:
+        self.nodes += len(actions)
+
+        # A batch costs about as much as a whole interval of nodes searched one at a time, so the clock is checked
+        # before each one
+        if self.deadline is not None and self.search_depth > 1 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        utilities = self.agent.evaluate_batch([state.place_disk(action) for action in actions])
+        sign = 1 if turn == State.BLACK else -1
+
+        best_action, best_score = None, -math.inf
+        for action, utility in zip(actions, utilities):
+            if sign * utility > best_score:
+                best_action, best_score = action, sign * utility
+
+        return best_action, best_score
+
+    # Returns the valid actions in the order they should be searched: the previous principal variation
+    # (or the transposition table's best move), then killer moves, then by history score
+    def order_moves(self, state: State, depth: int, table_action: Optional[Coordinate]) -> List[Coordinate]:
+        actions = state.valid_moves()
+        history = self.history[state.turn()]
+        actions.sort(key=lambda action: history[action[0] * State.SIZE + action[1]], reverse=True)
+
+        for killer in reversed(self.killers[depth]):
+            if killer in actions:
+                actions.remove(killer)
+                actions.insert(0, killer)
+
+        first_action = table_action
+        if self.follow_pv:
+            if depth < len(self.principal_variation) and self.principal_variation[depth] in actions:
+                first_action = self.principal_variation[depth]
+            else:
+                self.follow_pv = False
+
+        if first_action in actions:
+            actions.remove(first_action)
+            actions.insert(0, first_action)
+
+        return actions
+
+    # Updates the killer moves and history scores after an action caused a cutoff
+    def record_cutoff(self, history: List[int], action: Coordinate, depth: int, remaining_depth: int) -> None:
+        self.cutoffs += 1
+        killers = self.killers[depth]
+        if killers[0] != action:
+            killers[1] = killers[0]
+            killers[0] = action
+
+        history[action[0] * State.SIZE + action[1]] += remaining_depth * remaining_depth
+
     def evaluate(self, state: State) -> int:
         return self.agent.evaluate(state)
-    
+
+    # Returns the utility of the state from the point of view of the player to move
+    def evaluate_for_player(self, state: State) -> float:
+        utility = self.evaluate(state)
+        return utility if state.turn() == State.BLACK else -utility
+
+    def statistics(self) -> Dict[str, float]:
+        if self.probcut is None:
+            return self.agent.statistics()
+        return {**self.agent.statistics(), 'probcut_tries': self.probcut_tries, 'probcut_cuts': self.probcut_cuts}
+
     def __str__(self) -> str:
-        return f"{self.agent} Minimax, depth {self.depth}"
+        if self.time_limit is None:
+            description = f"{self.agent} Minimax, depth {self.depth}"
+        elif self.depth is None:
+            description = f"{self.agent} Minimax, {self.time_limit:g} ms"
+        else:
+            description = f"{self.agent} Minimax, depth {self.depth}, {self.time_limit:g} ms"
+
+        if self.algorithm != ALPHA_BETA:
+            description += f", {self.algorithm}"
+        if self.probcut is not None:
+            description += f", {self.probcut}"
+        if self.endgame_empties > 0:
+            description += f", solving the last {self.endgame_empties} empties"
+        return description
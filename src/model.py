@@ -1,11 +1,13 @@
-import pygame
-from typing import List, Tuple
-from constants import RED, BLACK, WHITE, DARK_GREEN, WINDOW_HEIGHT, WINDOW_WIDTH
+from typing import List, Optional, Tuple
+
+import bitboard
+import zobrist
 
 # A 0-indexed row, column coordinate pair on a Reversi board
 Coordinate = Tuple[int, int]
 
 # A complete Reversi game state
+# States are immutable values: moves return new states, and equal positions compare and hash equal
 class State:
     # The standard row and column dimension of a Reversi board
     SIZE = 8
@@ -25,81 +27,174 @@ class State:
                [0, 0, 0, 0, 0, 0, 0, 0],
                [0, 0, 0, 0, 0, 0, 0, 0]]
 
-    # GUI elements
-    CELL_SIZE = WINDOW_HEIGHT // SIZE
-    PADDING = 10
-    VALID_MOVE_DOT_SIZE = CELL_SIZE / 10
+    __slots__ = ('black', 'white', 'num_black', 'num_white', 'side', 'passed', 'key', 'moves', 'move_list')
 
     # Creates a new Reversi game state
     # If board is None, creates a board for a new game
-    def __init__(self, board: List[List[int]] = OTHELLO, window: pygame.display = None) -> None:
-        self.board = board
-        self.window = window
-    
+    # The board is stored as two 64-bit integers, one for each color (see bitboard.py)
+    # If turn is None, the player to move is worked out from the number of disks on the board; either way, a player
+    # with no valid moves passes the turn to their opponent
+    def __init__(self, board: List[List[int]] = OTHELLO, turn: Optional[int] = None) -> None:
+        black, white = bitboard.from_board(board, State.BLACK, State.WHITE)
+        self.set_position(black, white, turn)
+
+    # Creates a new Reversi game state directly from black and white bitboards
+    # If the hash of the position is already known, it can be passed in to avoid recomputing it
+    @staticmethod
+    def from_bitboards(black: int, white: int, zobrist_key: int = None, turn: Optional[int] = None) -> "State":
+        state = State.__new__(State)
+        state.set_position(black, white, turn, zobrist_key)
+        return state
+
+    def set_position(self, black: int, white: int, turn: Optional[int], zobrist_key: Optional[int] = None) -> None:
+        self.black = black
+        self.white = white
+        self.num_black = black.bit_count()
+        self.num_white = white.bit_count()
+
+        # The player to move, and whether they are moving again because their opponent had to pass
+        self.side = (self.num_black + self.num_white) % 2 + 1 if turn is None else turn
+        self.passed = False
+
+        # Zobrist hash of the position and player to move
+        if zobrist_key is None:
+            zobrist_key = zobrist.hash_bitboards(black, white, self.side == State.BLACK)
+        self.key = zobrist_key
+
+        # Valid moves of the player to move as a bitboard and as a list, computed when first needed.
+        # Until the moves are known, the player to move may still turn out to have to pass
+        self.moves = None
+        self.move_list = None
+
+    # A list-of-lists view of the board, rebuilt from the bitboards on every access
+    @property
+    def board(self) -> List[List[int]]:
+        return bitboard.to_board(self.black, self.white, State.BLACK, State.WHITE)
+
+    # Zobrist hash of the position and the player to move
+    @property
+    def zobrist_key(self) -> int:
+        if self.moves is None:
+            self.resolve_moves()
+        return self.key
+
     # Returns the number of black disks on the board
     def black_disks(self) -> int:
-        black_disks = 0
-
-        for row in self.board:
-            for cell in row:
-                if cell == State.BLACK:
-                    black_disks += 1
-        
-        return black_disks
+        return self.num_black
 
     # Returns the number of white disks on the board
     def white_disks(self) -> int:
-        white_disks = 0
-
-        for row in self.board:
-            for cell in row:
-                if cell == State.WHITE:
-                    white_disks += 1
-        
-        return white_disks
+        return self.num_white
 
     # Returns the integer corresponding to whose turn it is
     def turn(self) -> int:
-        return (self.black_disks() + self.white_disks()) % 2 + 1
-    
-    # Places the disk on the board if the move is valid and returns the resulting state
+        if self.moves is None:
+            self.resolve_moves()
+        return self.side
+
+    # Returns the bitboards of the player to move and their opponent
+    def players(self) -> Tuple[int, int]:
+        if self.turn() == State.BLACK:
+            return self.black, self.white
+        return self.white, self.black
+
+    # Works out the valid moves of the player to move, passing the turn if they have none and their opponent does
+    # This only fills in derived fields, so states can still be shared as immutable values
+    def resolve_moves(self) -> None:
+        if self.side == State.BLACK:
+            player, opponent = self.black, self.white
+        else:
+            player, opponent = self.white, self.black
+
+        moves = bitboard.get_moves(player, opponent)
+        if not moves:
+            opponent_moves = bitboard.get_moves(opponent, player)
+            if opponent_moves:
+                moves = opponent_moves
+                self.side = State.WHITE if self.side == State.BLACK else State.BLACK
+                self.passed = True
+                self.key ^= zobrist.SIDE_KEY
+
+        self.moves = moves
+
+    # Returns the state after the valid move, leaving this state unchanged
     # If the move is not valid, raises an error
     def place_disk(self, action: Coordinate) -> "State":
-        if not self.is_valid_move(action):
-            raise ValueError("Invalid move given")
-        
-        turn = self.turn()
-        
-        board = [[self.board[row][col] for col in range(State.SIZE)] for row in range(State.SIZE)]
-
+        move = self.check_move(action)
+        state = State.__new__(State)
+        state.copy_position(self)
+        state.apply_move(move)
+        return state
+
+    # Returns the move as a bit if it is valid, and raises an error otherwise
+    def check_move(self, action: Coordinate) -> int:
         row, column = action
 
-        board[row][column] = turn
-
-        directions = self.valid_move_directions(action)
-
-        for direction in directions:
-            row_delta, column_delta = direction
-
-            new_row = row + row_delta
-            new_column = column + column_delta
+        if not self.is_valid_coordinate(row, column):
+            raise ValueError("Invalid move given")
 
-            while board[new_row][new_column] == turn % 2 + 1:
-                board[new_row][new_column] = turn
+        move = bitboard.square(row, column)
 
-                new_row += row_delta
-                new_column += column_delta
+        if not self.valid_moves_bitboard() & move:
+            raise ValueError("Invalid move given")
 
-        return State(board, window=self.window)
+        return move
+
+    # Copies every field of the other state, which must have its moves resolved, into this newly created one
+    def copy_position(self, other: "State") -> None:
+        self.black = other.black
+        self.white = other.white
+        self.num_black = other.num_black
+        self.num_white = other.num_white
+        self.side = other.side
+        self.passed = other.passed
+        self.key = other.key
+        self.moves = other.moves
+        self.move_list = other.move_list
+
+    # Plays the valid move on this newly created state and returns the flipped disks
+    # The moves of the next player are resolved lazily
+    def apply_move(self, move: int) -> int:
+        black_to_move = self.side == State.BLACK
+
+        if black_to_move:
+            flips = bitboard.get_flips(self.black, self.white, move)
+            num_flips = flips.bit_count()
+            self.black |= move | flips
+            self.white ^= flips
+            self.num_black += num_flips + 1
+            self.num_white -= num_flips
+            self.side = State.WHITE
+        else:
+            flips = bitboard.get_flips(self.white, self.black, move)
+            num_flips = flips.bit_count()
+            self.white |= move | flips
+            self.black ^= flips
+            self.num_white += num_flips + 1
+            self.num_black -= num_flips
+            self.side = State.BLACK
+
+        self.key ^= zobrist.hash_move(move, flips, black_to_move) ^ zobrist.SIDE_KEY
+        self.passed = False
+        self.moves = None
+        self.move_list = None
+        return flips
+
+    # States are equal when they have the same disks and player to move
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, State):
+            return NotImplemented
+        return self.black == other.black and self.white == other.white and self.turn() == other.turn()
+
+    def __hash__(self) -> int:
+        return self.zobrist_key
 
     # Remove the disk placed in the given coordinate, if it exists, and return the new state
     def unplace_disk(self, action: Coordinate) -> "State":
-        board = [[self.board[row][col] for col in range(State.SIZE)] for row in range(State.SIZE)]
-
         row_index, col_index = action
-        board[row_index][col_index] = 0
+        mask = ~bitboard.square(row_index, col_index)
 
-        return State(board)
+        return State.from_bitboards(self.black & mask, self.white & mask)
 
     # Returns false if the move requested is not valid
     def is_valid_move(self, action: Coordinate) -> bool:
@@ -108,7 +203,7 @@ class State:
         if not self.is_valid_coordinate(row, column):
             return False
 
-        return len(self.valid_move_directions(action)) != 0
+        return self.valid_moves_bitboard() & bitboard.square(row, column) != 0
     
     def is_valid_coordinate(self, row_index: int, col_index: int) -> bool:
         return 0 <= row_index < State.SIZE and 0 <= col_index < State.SIZE
@@ -117,7 +212,7 @@ class State:
     def valid_move_directions(self, action: Coordinate) -> List[Coordinate]:
         row, column = action
 
-        if self.board[row][column] != 0:
+        if (self.black | self.white) & bitboard.square(row, column):
             return []
 
         directions = [(row, col) for row in range(-1, 2) for col in range(-1, 2)]
@@ -131,9 +226,9 @@ class State:
 
         if row_delta == 0 and column_delta == 0:
             return False
-        
-        turn = self.turn()
-        
+
+        player, opponent = self.players()
+
         row, column = action
 
         row += row_delta
@@ -141,49 +236,50 @@ class State:
 
         if not self.is_valid_coordinate(row, column):
             return False
-        if self.board[row][column] != turn % 2 + 1:
-            return False
-        
-        row += row_delta
-        column += column_delta
-
-        if not self.is_valid_coordinate(row, column):
+        if not opponent & bitboard.square(row, column):
             return False
 
-        while self.board[row][column] != turn:
-            if self.board[row][column] != turn % 2 + 1:
-                return False
-
+        while self.is_valid_coordinate(row, column) and opponent & bitboard.square(row, column):
             row += row_delta
             column += column_delta
 
-            if not self.is_valid_coordinate(row, column):
-                return False
-        
-        return True
+        return self.is_valid_coordinate(row, column) and player & bitboard.square(row, column) != 0
+
+    # Returns the set of valid actions from this Reversi state as a bitboard
+    def valid_moves_bitboard(self) -> int:
+        if self.moves is None:
+            self.resolve_moves()
+        return self.moves
     
     # Returns the list of valid actions from this Reversi state
     def valid_moves(self) -> List[Coordinate]:
-        if self.black_disks() + self.white_disks() == State.SIZE * State.SIZE:
-            return []
-        
-        moves = [(row, col) for row in range(State.SIZE) for col in range(State.SIZE)]
-        moves = [move for move in moves if self.is_valid_move(move)]
-
-        return moves
+        if self.move_list is None:
+            self.move_list = [(index >> 3, index & 7) for index in bitboard.iterate_bits(self.valid_moves_bitboard())]
+        return list(self.move_list)
     
-    # Returns true if the game is over
+    # Returns true if the game is over, which is when neither player has a valid move
     def game_over(self) -> bool:
-        return len(self.valid_moves()) == 0
+        return self.valid_moves_bitboard() == 0
 
     # Determine if the disk in the given coordinate is vulnerable (can be flipped by the opponent)
     def is_disk_vulnerable(self, coord: Coordinate) -> bool:
         row_index, col_index = coord
-        disk_value = self.board[row_index][col_index]
-        if disk_value == 0:
-            return False
-        # TODO
-        return False
+        return self.vulnerable_disks() & bitboard.square(row_index, col_index) != 0
+
+    # Returns the bitboard of disks of either color that their opponent could flip with a single move
+    def vulnerable_disks(self) -> int:
+        return bitboard.get_vulnerable(self.black, self.white) | bitboard.get_vulnerable(self.white, self.black)
+
+    # Determine if the disk in the given coordinate can never be flipped for the rest of the game
+    def is_disk_stable(self, coord: Coordinate) -> bool:
+        row_index, col_index = coord
+        return self.stable_disks() & bitboard.square(row_index, col_index) != 0
+
+    # Returns the bitboard of disks of either color found to be stable (see bitboard.grow_stable)
+    # Stable disks are never vulnerable
+    def stable_disks(self) -> int:
+        black_stable, white_stable = bitboard.get_stable_disks(self.black, self.white)
+        return black_stable | white_stable
 
     # Returns the integer representation of the player who is winning
     # Returns 0 if the game is tied
@@ -212,59 +308,49 @@ class State:
         return board_string
 
 
-    """ STATIC METHODS """
+# A mutable copy of a state for searches, which make and undo moves in place rather than creating a state per node
+# Search states are not hashable; use zobrist_key or freeze() to key caches
+class SearchState(State):
+    __slots__ = ('undo_stack',)
+    __hash__ = None
 
-    @staticmethod
-    def get_coordinate_from_position(position: Coordinate) -> Coordinate:
-        x_coord, y_coord = position
-        return x_coord // State.CELL_SIZE, y_coord // State.CELL_SIZE
+    def __init__(self, state: State) -> None:
+        state.turn()
+        self.copy_position(state)
+        # (move, flipped disks, previous hash, player to move, passed, moves, move list) for each move made in place,
+        # most recent last
+        self.undo_stack = []
 
-    @staticmethod
-    def get_position_from_coordinate(row_index: int, col_index: int) -> Coordinate:
-        x_coord = row_index * State.CELL_SIZE + State.CELL_SIZE // 2
-        y_coord = col_index * State.CELL_SIZE + State.CELL_SIZE // 2
-        return x_coord, y_coord
-
-    """ PAINT METHODS """
-
-    def repaint(self) -> None:
-        if self.window is None:
-            raise RuntimeError("window is None. This method should not be called in command line mode")
-
-        self.__repaint_board()
-        self.__repaint_valid_moves(self.valid_moves())
-        pygame.display.update()
-
-    def __repaint_board(self) -> None:
-        self.__repaint_background()
-
-        for row in range(State.SIZE):
-            for col in range(State.SIZE):
-                cell = self.board[row][col]
-                self.__repaint_piece(row, col, cell)
-
-    def __repaint_background(self) -> None:
-        self.window.fill(DARK_GREEN)
-
-        for row_index in range(State.SIZE):
-            start_pos = (0, row_index * State.CELL_SIZE)
-            end_pos = (WINDOW_WIDTH, row_index * State.CELL_SIZE)
-            pygame.draw.line(self.window, BLACK, start_pos, end_pos, width=3)
-        
-        for col_index in range(State.SIZE):
-            start_pos = (col_index * State.CELL_SIZE, 0)
-            end_pos = (col_index * State.CELL_SIZE, WINDOW_HEIGHT)
-            pygame.draw.line(self.window, BLACK, start_pos, end_pos, width=3)
-
-    def __repaint_piece(self, row: int, col: int, cell: int) -> None:
-        if cell == 0:
-            return
-
-        radius = (State.CELL_SIZE - 2 * State.PADDING) // 2
-        piece_color = BLACK if cell == State.BLACK else WHITE
-        piece_position = State.get_position_from_coordinate(row, col)
-        pygame.draw.circle(self.window, piece_color, piece_position, radius)
-
-    def __repaint_valid_moves(self, valid_moves: List[Coordinate]) -> None:
-        for row_index, col_index in valid_moves:
-            pygame.draw.circle(self.window, RED, State.get_position_from_coordinate(row_index, col_index), self.VALID_MOVE_DOT_SIZE)
+    # Places the disk on this board in place and records the flipped disks on the undo stack
+    # If the move is not valid, raises an error
+    def make_move(self, action: Coordinate) -> None:
+        move = self.check_move(action)
+        undo = (self.key, self.side, self.passed, self.moves, self.move_list)
+        flips = self.apply_move(move)
+        self.undo_stack.append((move, flips) + undo)
+
+    # Reverts the last move made with make_move
+    def undo_move(self) -> None:
+        if not self.undo_stack:
+            raise ValueError("No move to undo")
+
+        move, flips, self.key, self.side, self.passed, self.moves, self.move_list = self.undo_stack.pop()
+        num_flips = flips.bit_count()
+
+        if self.side == State.BLACK:
+            self.black ^= move | flips
+            self.white |= flips
+            self.num_black -= num_flips + 1
+            self.num_white += num_flips
+        else:
+            self.white ^= move | flips
+            self.black |= flips
+            self.num_white -= num_flips + 1
+            self.num_black += num_flips
+
+    # Returns an immutable copy of the current position
+    def freeze(self) -> State:
+        self.turn()
+        state = State.__new__(State)
+        state.copy_position(self)
+        return state
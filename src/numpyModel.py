@@ -0,0 +1,164 @@
+import json
+import os
+import sys
+import numpy as np
+from typing import Any, Dict, List
+
+# A pure NumPy implementation of the forward pass of the Keras Sequential models in models/
+# Weights are read once from the Keras .h5 file (which needs h5py) and can be cached in a .npz file,
+# which only needs NumPy to load
+class NumpyModel:
+    # Layers with no effect at inference time
+    PASSTHROUGH_LAYERS = {'InputLayer', 'Dropout'}
+
+    ACTIVATIONS = {
+        'linear': lambda x: x,
+        'relu': lambda x: np.maximum(x, 0),
+        'sigmoid': lambda x: 0.5 * (1 + np.tanh(0.5 * x)),
+        'tanh': np.tanh,
+    }
+
+    # Creates a model from Keras layer configs (class_name and config pairs) and their weights in layer order
+    def __init__(self, layers: List[Dict[str, Any]], weights: List[List[np.ndarray]]) -> None:
+        self.layers = [layer for layer in layers if layer['class_name'] not in NumpyModel.PASSTHROUGH_LAYERS]
+        self.weights = weights
+
+        for layer in self.layers:
+            if not hasattr(self, f"_{layer['class_name']}"):
+                raise ValueError(f"Unsupported layer type: {layer['class_name']}")
+
+        if len(self.weights) != len(self.layers):
+            raise ValueError("Expected one list of weights per layer")
+
+    # Runs the model on a batch of inputs and returns the batch of outputs
+    def __call__(self, inputs: np.ndarray) -> np.ndarray:
+        outputs = np.asarray(inputs, dtype=np.float32)
+
+        for layer, weights in zip(self.layers, self.weights):
+            outputs = getattr(self, f"_{layer['class_name']}")(outputs, layer['config'], weights)
+
+        return outputs
+
+    def _Conv2D(self, inputs: np.ndarray, config: Dict[str, Any], weights: List[np.ndarray]) -> np.ndarray:
+        NumpyModel.check_channels_last(config)
+        if tuple(config.get('dilation_rate', (1, 1))) != (1, 1):
+            raise ValueError("Dilated convolutions are not supported")
+
+        kernel = weights[0]
+        kernel_height, kernel_width = kernel.shape[:2]
+        stride_height, stride_width = config.get('strides', (1, 1))
+
+        if config.get('padding', 'valid') == 'same':
+            pad_height, pad_width = kernel_height - 1, kernel_width - 1
+            inputs = np.pad(inputs, ((0, 0),
+                                     (pad_height // 2, pad_height - pad_height // 2),
+                                     (pad_width // 2, pad_width - pad_width // 2),
+                                     (0, 0)))
+
+        # N x H x W x C x kernel height x kernel width
+        windows = np.lib.stride_tricks.sliding_window_view(inputs, (kernel_height, kernel_width), axis=(1, 2))
+        windows = windows[:, ::stride_height, ::stride_width]
+        outputs = np.einsum('nhwcij,ijcf->nhwf', windows, kernel, optimize=True)
+
+        if config.get('use_bias', True):
+            outputs += weights[1]
+
+        return NumpyModel.ACTIVATIONS[config.get('activation', 'linear')](outputs)
+
+    def _MaxPooling2D(self, inputs: np.ndarray, config: Dict[str, Any], weights: List[np.ndarray]) -> np.ndarray:
+        NumpyModel.check_channels_last(config)
+        pool_height, pool_width = config['pool_size']
+        strides = config.get('strides') or config['pool_size']
+
+        if tuple(strides) != (pool_height, pool_width) or config.get('padding', 'valid') != 'valid':
+            raise ValueError("Only non-overlapping max pooling with valid padding is supported")
+
+        batch, height, width, channels = inputs.shape
+        height, width = height // pool_height, width // pool_width
+        inputs = inputs[:, :height * pool_height, :width * pool_width]
+
+        return inputs.reshape(batch, height, pool_height, width, pool_width, channels).max(axis=(2, 4))
+
+    def _Flatten(self, inputs: np.ndarray, config: Dict[str, Any], weights: List[np.ndarray]) -> np.ndarray:
+        return inputs.reshape(inputs.shape[0], -1)
+
+    def _Dense(self, inputs: np.ndarray, config: Dict[str, Any], weights: List[np.ndarray]) -> np.ndarray:
+        outputs = inputs @ weights[0]
+
+        if config.get('use_bias', True):
+            outputs += weights[1]
+
+        return NumpyModel.ACTIVATIONS[config.get('activation', 'linear')](outputs)
+
+    @staticmethod
+    def check_channels_last(config: Dict[str, Any]) -> None:
+        if config.get('data_format', 'channels_last') != 'channels_last':
+            raise ValueError("Only channels_last data is supported")
+
+    # Reads the architecture and weights of a Keras Sequential model saved in the .h5 format
+    @staticmethod
+    def from_h5(path: str) -> "NumpyModel":
+        import h5py
+
+        with h5py.File(path, 'r') as file:
+            model_config = json.loads(file.attrs['model_config'])
+            layers = model_config['config']['layers'] if isinstance(model_config['config'], dict) else model_config['config']
+
+            weights = []
+            for layer in layers:
+                if layer['class_name'] in NumpyModel.PASSTHROUGH_LAYERS:
+                    continue
+                group = file['model_weights'][layer['config']['name']]
+                weight_names = [name.decode() if isinstance(name, bytes) else name for name in group.attrs['weight_names']]
+                weights.append([np.asarray(group[name], dtype=np.float32) for name in weight_names])
+
+        return NumpyModel(layers, weights)
+
+    # Loads a model saved with save_npz
+    @staticmethod
+    def from_npz(path: str) -> "NumpyModel":
+        with np.load(path) as file:
+            layers = json.loads(str(file['layers']))
+            weights = [[file[f'{index}_{weight_index}'] for weight_index in range(int(file[f'{index}_count']))]
+                       for index in range(len(layers))]
+
+        return NumpyModel(layers, weights)
+
+    # Saves the architecture and weights to a .npz file
+    def save_npz(self, path: str) -> None:
+        arrays = {'layers': np.array(json.dumps(self.layers))}
+
+        for index, weights in enumerate(self.weights):
+            arrays[f'{index}_count'] = np.array(len(weights))
+            for weight_index, weight in enumerate(weights):
+                arrays[f'{index}_{weight_index}'] = weight
+
+        np.savez(path, **arrays)
+
+    # Loads a model from a .h5 or .npz file
+    # For a .h5 file, a .npz cache next to it is used if it is up to date, and otherwise written if cache is true
+    @staticmethod
+    def load(path: str, cache: bool = True) -> "NumpyModel":
+        if path.endswith('.npz'):
+            return NumpyModel.from_npz(path)
+
+        cache_path = os.path.splitext(path)[0] + '.npz'
+        if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            return NumpyModel.from_npz(cache_path)
+
+        model = NumpyModel.from_h5(path)
+        if cache:
+            try:
+                model.save_npz(cache_path)
+            except OSError:
+                pass
+
+        return model
+
+
+# Converts the given .h5 models to .npz caches
+if __name__ == '__main__':
+    for h5_path in sys.argv[1:]:
+        npz_path = os.path.splitext(h5_path)[0] + '.npz'
+        NumpyModel.from_h5(h5_path).save_npz(npz_path)
+        print(f'Wrote {npz_path}')
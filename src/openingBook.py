@@ -0,0 +1,195 @@
+import argparse
+import mmap
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import symmetry
+from agents import Agent
+from minimax import MinimaxAgent
+from model import Coordinate, State
+
+# An opening book is a binary file of fixed-size records sorted by position hash:
+#   header: magic, format version, number of records
+#   record: Zobrist hash of the position, score of the best move, bitboard cell index of the best move
+# Positions are stored once for all eight symmetries, in their canonical form (see symmetry.py), so the hash
+# and the move are those of the canonical position
+# Books are memory-mapped for lookups, so every process reading the same book shares its pages
+MAGIC = b'RVBK'
+VERSION = 3
+HEADER = struct.Struct('<4sII')
+RECORD = struct.Struct('<QfB3x')
+KEY = struct.Struct('<Q')
+
+
+# A read-only, memory-mapped opening book
+class OpeningBook:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        if len(self.data) != HEADER.size + self.size * RECORD.size:
+            raise ValueError(f"{path} is truncated")
+
+        self.hits = 0
+        self.misses = 0
+
+    # Returns the best move and its score for the position with the given hash, or None if it is not in the book
+    def lookup(self, key: int) -> Optional[Tuple[Coordinate, float]]:
+        low, high = 0, self.size
+
+        while low < high:
+            middle = (low + high) // 2
+            middle_key = KEY.unpack_from(self.data, HEADER.size + middle * RECORD.size)[0]
+            if middle_key < key:
+                low = middle + 1
+            elif middle_key > key:
+                high = middle
+            else:
+                _, score, index = RECORD.unpack_from(self.data, HEADER.size + middle * RECORD.size)
+                self.hits += 1
+                return (index // State.SIZE, index % State.SIZE), score
+
+        self.misses += 1
+        return None
+
+    # Returns the book move for the state, or for any of its symmetric images, or None if it is not in the book
+    def get_action(self, state: State) -> Optional[Coordinate]:
+        canonical_state, transform = symmetry.canonicalize(state)
+        entry = self.lookup(canonical_state.zobrist_key)
+        if entry is None:
+            return None
+
+        action = symmetry.transform_action(entry[0], symmetry.INVERSE[transform])
+        if not state.is_valid_move(action):
+            return None
+        return action
+
+    def close(self) -> None:
+        self.data.close()
+
+    def __len__(self) -> int:
+        return self.size
+
+    # Writes a book containing the given best move and score for each canonical position hash
+    @staticmethod
+    def write(path: str, entries: Dict[int, Tuple[Coordinate, float]]) -> None:
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(entries)))
+            for key in sorted(entries):
+                (row, col), score = entries[key]
+                file.write(RECORD.pack(key, score, row * State.SIZE + col))
+
+
+# Agent that plays the book move whenever the position is in the opening book, and otherwise asks another agent
+class BookAgent(Agent):
+    def __init__(self, agent: Agent, book: OpeningBook) -> None:
+        self.agent = agent
+        self.book = book
+        self.ponders = agent.ponders
+        self.book_hits = 0
+        self.book_misses = 0
+
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        action = self.book.get_action(state)
+
+        if action is None:
+            self.book_misses += 1
+            return self.agent.get_action(state, deadline)
+
+        # The agent is not asked for this move, so it stops anything it does between moves
+        self.book_hits += 1
+        self.agent.stop_thinking()
+        return action
+
+    def evaluate(self, state: State) -> int:
+        return self.agent.evaluate(state)
+
+    def statistics(self) -> Dict[str, float]:
+        return {**self.agent.statistics(), 'book_hits': self.book_hits, 'book_misses': self.book_misses}
+
+    # Book moves take no search, so only the moves of the agent are recorded
+    def instrument(self) -> None:
+        self.agent.instrument()
+
+    def take_move_records(self) -> List[Dict[str, float]]:
+        return self.agent.take_move_records()
+
+    def stop_thinking(self) -> None:
+        self.agent.stop_thinking()
+
+    def close(self) -> None:
+        self.agent.close()
+        self.book.close()
+
+    def __str__(self) -> str:
+        return f"{self.agent} with opening book"
+
+
+# Builds a book by searching every position within full_width_plies plies of the start of the game, then following
+# the best line from each of those positions for extend_plies more plies
+def generate(agent: Agent, depth: int, full_width_plies: int, extend_plies: int,
+             progress: bool = False) -> Dict[int, Tuple[Coordinate, float]]:
+    searcher = MinimaxAgent(agent, depth)
+    entries = {}
+
+    # Searches the canonical form of the state and returns the best move in the state itself
+    def search(state: State) -> Optional[Coordinate]:
+        canonical_state, transform = symmetry.canonicalize(state)
+        key = canonical_state.zobrist_key
+
+        if key in entries:
+            action = entries[key][0]
+        else:
+            action = searcher.get_action(canonical_state)
+            if action is None:
+                return None
+            entries[key] = (action, searcher.score)
+            if progress and len(entries) % 100 == 0:
+                print(f'{len(entries)} positions searched')
+
+        return symmetry.transform_action(action, symmetry.INVERSE[transform])
+
+    frontier: List[State] = [State()]
+    for _ in range(full_width_plies):
+        next_frontier = {}
+        for state in frontier:
+            if search(state) is None:
+                continue
+            for action in state.valid_moves():
+                child = state.place_disk(action)
+                next_frontier[symmetry.canonical_key(child)] = child
+        frontier = list(next_frontier.values())
+
+    for state in frontier:
+        for _ in range(extend_plies):
+            action = search(state)
+            if action is None:
+                break
+            state = state.place_disk(action)
+
+    return entries
+
+
+# Generates an opening book offline
+if __name__ == '__main__':
+    from registry import AGENT_CHOICES
+
+    parser = argparse.ArgumentParser(prog = 'Reversi AI opening book generator')
+    parser.add_argument('output')
+    parser.add_argument('-a', '--agent', default = 'superior', choices = AGENT_CHOICES)
+    parser.add_argument('-d', '--depth', type = int, default = 6)
+    parser.add_argument('-p', '--plies', type = int, default = 4)
+    parser.add_argument('-e', '--extend', type = int, default = 8)
+
+    args = parser.parse_args()
+
+    start_time = time.time()
+    entries = generate(AGENT_CHOICES[args.agent](), args.depth, args.plies, args.extend, progress = True)
+    OpeningBook.write(args.output, entries)
+
+    print(f'Wrote {len(entries)} positions to {args.output} in {round(time.time() - start_time)} seconds')
@@ -0,0 +1,199 @@
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from agents import Agent
+from minimax import ALPHA_BETA, MinimaxAgent, SearchTimeout
+from model import Coordinate, SearchState, State
+from probcut import ProbCut
+
+# The minimax agent owned by each worker process, created once by the pool initializer
+_worker_agent = None
+
+
+def _initialize_worker(agent: Agent, table_memory: float, algorithm: str, probcut: Optional[ProbCut]) -> None:
+    global _worker_agent
+    _worker_agent = MinimaxAgent(agent, 1, table_memory, algorithm=algorithm, probcut=probcut)
+
+
+# Searches the action at the root of a search to the given depth within the given window, as the serial search
+# would, starting MTD(f) from the guess
+# Returns the score, principal variation, node count and search time, or None if the time ran out
+def _search_action(black: int, white: int, turn: int, action: Coordinate, depth: int, alpha: float, beta: float,
+                   guess: Optional[float], time_limit: Optional[float]) -> Optional[Tuple[float, List[Coordinate], int, float]]:
+    start_time = time.perf_counter()
+
+    state = SearchState(State.from_bitboards(black, white, turn=turn))
+
+    _worker_agent.prepare_search(time_limit)
+    _worker_agent.search_depth = depth
+    try:
+        score = _worker_agent.search_move(state, action, alpha, beta, guess)
+    except SearchTimeout:
+        return None
+
+    return score, _worker_agent.principal_variation, _worker_agent.nodes, time.perf_counter() - start_time
+
+
+# A minimax agent that splits the moves at the root of each search across a pool of worker processes
+# The first move in search order is searched in this process to get a bound, then the remaining moves are
+# searched in parallel against that bound. The chosen move is the first move in search order with the best
+# score, which is the move the serial search picks at the same depth
+class ParallelMinimaxAgent(MinimaxAgent):
+    # Creates a new parallel minimax agent using the given number of worker processes
+    def __init__(self, agent: Agent, depth: Optional[int], table_memory: float = 16, time_limit: Optional[float] = None,
+                 endgame_empties: int = 0, algorithm: str = ALPHA_BETA, probcut: Optional[ProbCut] = None,
+                 workers: int = os.cpu_count()):
+        super().__init__(agent, depth, table_memory, time_limit, endgame_empties, algorithm, probcut)
+        self.workers = workers
+        self.pool = None
+
+        # Total time spent searching in the worker processes and in this process during the last search
+        self.worker_time = 0.0
+        self.search_time = 0.0
+
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        self.worker_time = 0.0
+        start_time = time.perf_counter()
+
+        action = super().get_action(state, deadline)
+
+        self.search_time = time.perf_counter() - start_time
+        return action
+
+    def search_root(self, state: State, alpha: float = -math.inf, beta: float = math.inf) -> Coordinate:
+        table_action = None
+        if self.table is not None:
+            entry = self.table.lookup(state.zobrist_key)
+            if entry is not None:
+                table_action = entry.move
+
+        self.follow_pv = True
+        actions = self.order_moves(state, 0, table_action)
+
+        if len(actions) <= 1 or self.search_depth <= 1:
+            return super().search_root(state, alpha, beta)
+
+        maximize = state.turn() == State.BLACK
+
+        # Search the first move here to get a bound for the other moves, starting MTD(f) from the score of the
+        # previous iteration
+        # Moves are searched from the first ply below the root, like in the serial search, so ProbCut and the
+        # killer moves see the same plies
+        first_action = actions[0]
+        start_time = time.perf_counter()
+        best_score = self.search_move(state, first_action, alpha, beta, self.score)
+        self.worker_time += time.perf_counter() - start_time
+
+        best_action = first_action
+        principal_variation = self.principal_variation
+
+        if maximize:
+            window = (max(alpha, best_score), beta)
+        else:
+            window = (alpha, min(beta, best_score))
+
+        time_limit = None
+        if self.deadline is not None:
+            time_limit = max(0, self.deadline - time.perf_counter()) * 1000
+
+        # The score of the first move is the best guess of the score of the others for MTD(f)
+        pool = self.get_pool()
+        futures = [pool.submit(_search_action, state.black, state.white, state.turn(), action, self.search_depth, *window,
+                               best_score, time_limit)
+                   for action in actions[1:]]
+
+        # Collect results in search order so ties go to the earlier move, as in the serial search
+        timed_out = False
+        for action, future in zip(actions[1:], futures):
+            result = future.result()
+            if result is None:
+                timed_out = True
+                continue
+
+            score, variation, nodes, search_time = result
+            self.nodes += nodes
+            self.worker_time += search_time
+
+            if (maximize and score > best_score) or (not maximize and score < best_score):
+                best_action, best_score = action, score
+                principal_variation = variation
+
+        if timed_out:
+            raise SearchTimeout()
+
+        self.score = best_score
+        self.principal_variation = principal_variation
+        return best_action
+
+    # Returns the worker pool, starting it on first use
+    def get_pool(self) -> ProcessPoolExecutor:
+        if self.pool is None:
+            table_memory = 0 if self.table is None else self.table.size * self.table.ENTRY_BYTES / (1024 * 1024)
+            self.pool = ProcessPoolExecutor(self.workers, initializer=_initialize_worker, initargs=(self.agent, table_memory, self.algorithm, self.probcut))
+        return self.pool
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    # Returns how many cores were kept busy on average during the last search
+    def parallelism(self) -> float:
+        return self.worker_time / self.search_time if self.search_time else 0.0
+
+    def __str__(self) -> str:
+        return f"{super().__str__()}, {self.workers} workers"
+
+
+# Returns the serial and parallel search times and whether both searches chose the same move and score
+def measure_speedup(agent: Agent, depth: int, workers: int, state: State) -> Tuple[float, float, bool]:
+    serial_agent = MinimaxAgent(agent, depth)
+    start_time = time.perf_counter()
+    serial_action = serial_agent.get_action(state)
+    serial_time = time.perf_counter() - start_time
+
+    parallel_agent = ParallelMinimaxAgent(agent, depth, workers=workers)
+    parallel_agent.get_pool()
+    parallel_action = parallel_agent.get_action(state)
+    parallel_time = parallel_agent.search_time
+    parallel_agent.close()
+
+    matches = serial_action == parallel_action and serial_agent.score == parallel_agent.score
+    return serial_time, parallel_time, matches
+
+
+# Reports the speedup of the parallel search over the serial search on random midgame positions
+if __name__ == '__main__':
+    from registry import AGENT_CHOICES
+
+    parser = argparse.ArgumentParser(prog = 'Reversi AI parallel search benchmark')
+    parser.add_argument('agent', choices = AGENT_CHOICES)
+    parser.add_argument('depth', type = int)
+    parser.add_argument('-j', '--workers', type = int, default = os.cpu_count())
+    parser.add_argument('-p', '--positions', type = int, default = 5)
+    parser.add_argument('--plies', type = int, default = 20)
+    parser.add_argument('--seed', type = int, default = 0)
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    total_serial_time, total_parallel_time = 0.0, 0.0
+    for i in range(args.positions):
+        state = State()
+        for _ in range(args.plies):
+            if state.game_over():
+                break
+            state = state.place_disk(random.choice(state.valid_moves()))
+
+        serial_time, parallel_time, matches = measure_speedup(AGENT_CHOICES[args.agent](), args.depth, args.workers, state)
+        total_serial_time += serial_time
+        total_parallel_time += parallel_time
+        print(f'Position {i}: serial {round(serial_time, 3)} s, parallel {round(parallel_time, 3)} s, '
+              f'speedup {round(serial_time / parallel_time, 2)}x, same move: {matches}')
+
+    print(f'Overall speedup with {args.workers} workers: {round(total_serial_time / total_parallel_time, 2)}x')
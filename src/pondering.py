@@ -0,0 +1,128 @@
+import math
+import threading
+from typing import Dict, List, Optional
+
+from agents import Agent
+from minimax import MinimaxAgent
+from model import Coordinate, State
+
+# Pondering: after choosing its move, an agent guesses the opponent's reply and searches the position after it in
+# a background thread while the opponent thinks. If the guess is right, the move is ready (or the transposition
+# table is warm) when the agent's turn comes; if it is wrong, the background search is stopped and thrown away
+# The search runs on a thread of the same process, so it shares the CPU with the opponent when the opponent is
+# another agent in this process; it pays off most against a human, whose thinking time leaves the CPU idle, and
+# games on a clock only allow it against a human
+
+
+# Minimax agent that searches on the opponent's time
+# The reply it expects is the second move of the principal variation of its own search, or the best reply by the
+# evaluation function when the search has none
+class PonderingAgent(Agent):
+    ponders = True
+
+    # How often the background search is told to stop until it does, in seconds
+    STOP_INTERVAL = 0.01
+
+    def __init__(self, agent: MinimaxAgent) -> None:
+        self.agent = agent
+
+        # The background search, the position it searches, and the move it found and the counters of its search if
+        # it finished on its own
+        self.thread: Optional[threading.Thread] = None
+        self.ponder_state: Optional[State] = None
+        self.ponder_action: Optional[Coordinate] = None
+        self.ponder_counters: Optional[Dict[str, float]] = None
+        self.stopping = False
+
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    def get_action(self, state: State, deadline: Optional[float] = None) -> Coordinate:
+        action = None
+        if self.stop_pondering() is not None:
+            if self.ponder_state == state:
+                self.ponder_hits += 1
+                action = self.ponder_action
+                # The move is recorded with the search that found it, as if it had been searched on this turn
+                if self.ponder_counters is not None:
+                    self.agent.instruments.record(self.ponder_counters)
+            else:
+                self.ponder_misses += 1
+
+        # After an interrupted search on the right position, searching again mostly finds its results in the table
+        if action is None:
+            action = self.agent.get_action(state, deadline)
+
+        self.start_pondering(state, action)
+        return action
+
+    # Starts searching the position after the move and the expected reply, unless the opponent has to pass
+    def start_pondering(self, state: State, action: Coordinate) -> None:
+        next_state = state.place_disk(action)
+        if next_state.game_over() or next_state.turn() == state.turn():
+            return
+
+        principal_variation = self.agent.principal_variation
+        if len(principal_variation) > 1 and principal_variation[0] == action and \
+                principal_variation[1] in next_state.valid_moves():
+            reply = principal_variation[1]
+        else:
+            reply = self.agent.agent.get_action(next_state)
+
+        self.ponder_state = next_state.place_disk(reply)
+        self.ponder_action = None
+        self.ponder_counters = None
+        self.stopping = False
+        self.thread = threading.Thread(target=self.ponder, args=(self.ponder_state,), daemon=True)
+        self.thread.start()
+
+    # Searches the position as the agent would on its turn, and keeps the move if the search was not stopped
+    # The infinite deadline only makes the search check the clock, so that stop() can interrupt it
+    def ponder(self, state: State) -> None:
+        if self.agent.instruments is None:
+            action, counters = self.agent.choose_action(state, math.inf), None
+        else:
+            action, counters = self.agent.measure_action(state, math.inf)
+
+        if not self.stopping:
+            self.ponder_action = action
+            self.ponder_counters = counters
+
+    # Stops the background search and waits for it to finish
+    # Returns the position it searched, or None if the agent was not pondering
+    def stop_pondering(self) -> Optional[State]:
+        if self.thread is None:
+            return None
+
+        # The search may not have started yet when first told to stop, so it is told again until it ends
+        self.stopping = self.thread.is_alive()
+        while self.thread.is_alive():
+            self.agent.stop()
+            self.thread.join(PonderingAgent.STOP_INTERVAL)
+
+        self.thread = None
+        return self.ponder_state
+
+    # The position searched in the background cannot come up once the game is over or the agent was not asked for
+    # its move, so the search is thrown away
+    def stop_thinking(self) -> None:
+        self.stop_pondering()
+
+    def evaluate(self, state: State) -> int:
+        return self.agent.evaluate(state)
+
+    def instrument(self) -> None:
+        self.agent.instrument()
+
+    def take_move_records(self) -> List[Dict[str, float]]:
+        return self.agent.take_move_records()
+
+    def statistics(self) -> Dict[str, float]:
+        return {**self.agent.statistics(), 'ponder_hits': self.ponder_hits, 'ponder_misses': self.ponder_misses}
+
+    def close(self) -> None:
+        self.stop_pondering()
+        self.agent.close()
+
+    def __str__(self) -> str:
+        return f"{self.agent}, pondering"
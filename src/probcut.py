@@ -0,0 +1,188 @@
+import argparse
+import json
+import math
+import random
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from agents import Agent
+from model import State
+
+# Multi-ProbCut (Buro, 1999): before searching a node to a large depth, a search to a much smaller depth predicts
+# the deep score with a linear model, and if the prediction is very likely outside the window, the node is cut
+# without the deep search. The model is fitted offline per game stage on positions from self-play
+
+
+# Predicts the deep search score of a position as slope * shallow score + intercept, off by error (the standard
+# deviation of the residuals) on the positions it was fitted on
+class Cut(NamedTuple):
+    shallow_depth: int
+    slope: float
+    intercept: float
+    error: float
+
+
+# The cuts of every depth and game stage, read from and written to a small JSON parameter file
+class ProbCut:
+    VERSION = 1
+
+    # Number of empty cells in each game stage
+    STAGE_EMPTIES = 10
+
+    # Smallest depth to cut at
+    MIN_DEPTH = 3
+
+    # Cuts are fitted on at least this many positions
+    MIN_SAMPLES = 10
+
+    # Creates ProbCut parameters from cuts keyed by (depth, stage), tried in order at each node
+    # A node is cut when its score is outside the window by more than threshold times the error of the cut
+    def __init__(self, cuts: Dict[Tuple[int, int], List[Cut]], threshold: float = 1.0, agent: str = '') -> None:
+        self.cuts = cuts
+        self.threshold = threshold
+        self.agent = agent
+
+    # Returns the game stage of a position with the given number of empty cells
+    @staticmethod
+    def stage(empty_cells: int) -> int:
+        return empty_cells // ProbCut.STAGE_EMPTIES
+
+    # Returns the depths of the shallow searches that predict a search to the given depth: those of the same parity
+    # as the depth (which plays a similar role in the evaluation) and at most half of it
+    @staticmethod
+    def shallow_depths(depth: int) -> List[int]:
+        return list(range(2 - depth % 2, depth // 2 + 1, 2))
+
+    # Returns the cuts to try before searching a position with the given number of empty cells to the given depth
+    def lookup(self, depth: int, empty_cells: int) -> List[Cut]:
+        return self.cuts.get((depth, ProbCut.stage(empty_cells)), [])
+
+    @staticmethod
+    def load(path: str) -> "ProbCut":
+        with open(path) as file:
+            parameters = json.load(file)
+
+        if parameters.get('version') != ProbCut.VERSION:
+            raise ValueError(f"{path} is not a version {ProbCut.VERSION} ProbCut parameter file")
+
+        cuts = {}
+        for cut in parameters['cuts']:
+            cuts.setdefault((cut['depth'], cut['stage']), []).append(
+                Cut(cut['shallow_depth'], cut['slope'], cut['intercept'], cut['error']))
+
+        return ProbCut(cuts, parameters['threshold'], parameters['agent'])
+
+    def save(self, path: str) -> None:
+        cuts = [{'depth': depth, 'stage': stage, **cut._asdict()}
+                for (depth, stage), stage_cuts in sorted(self.cuts.items()) for cut in stage_cuts]
+
+        with open(path, 'w') as file:
+            json.dump({'version': ProbCut.VERSION, 'agent': self.agent, 'threshold': self.threshold,
+                       'stage_empties': ProbCut.STAGE_EMPTIES, 'cuts': cuts}, file, indent=1)
+
+    def __str__(self) -> str:
+        return f"ProbCut at {self.threshold:g} sigma"
+
+
+# Plays games of the agent searching to a depth of one ply against itself, with a random move in place of the
+# searched one with the given probability, and returns every position that is still searchable to max_depth
+def generate_positions(agent: Agent, num_games: int, max_depth: int, random_move_rate: float = 0.25) -> List[State]:
+    from minimax import MinimaxAgent
+
+    player = MinimaxAgent(agent, 1, 0)
+    positions = []
+
+    for _ in range(num_games):
+        state = State()
+        while not state.game_over():
+            if State.SIZE * State.SIZE - state.black_disks() - state.white_disks() > max_depth:
+                positions.append(state)
+
+            if random.random() < random_move_rate:
+                action = random.choice(state.valid_moves())
+            else:
+                action = player.get_action(state)
+            state = state.place_disk(action)
+
+    return positions
+
+
+# Returns the score of the position at each depth from 1 to max_depth, from the point of view of the player to move
+def search_scores(agent: Agent, state: State, max_depth: int) -> List[float]:
+    from minimax import MinimaxAgent
+
+    # The transposition table carries move ordering over from one depth to the next
+    searcher = MinimaxAgent(agent, max_depth)
+    scores = []
+    for depth in range(1, max_depth + 1):
+        searcher.depth = depth
+        searcher.get_action(state)
+        scores.append(searcher.score if state.turn() == State.BLACK else -searcher.score)
+
+    return scores
+
+
+# Fits deep = slope * shallow + intercept by least squares and returns the cut, or None if the fit is unusable
+def fit(shallow_depth: int, samples: List[Tuple[float, float]]) -> Optional[Cut]:
+    count = len(samples)
+    mean_shallow = sum(shallow for shallow, _ in samples) / count
+    mean_deep = sum(deep for _, deep in samples) / count
+
+    variance = sum((shallow - mean_shallow) ** 2 for shallow, _ in samples)
+    if variance == 0:
+        return None
+
+    slope = sum((shallow - mean_shallow) * (deep - mean_deep) for shallow, deep in samples) / variance
+    if slope <= 0:
+        return None
+
+    intercept = mean_deep - slope * mean_shallow
+    error = math.sqrt(sum((deep - slope * shallow - intercept) ** 2 for shallow, deep in samples) / count)
+    return Cut(shallow_depth, slope, intercept, error)
+
+
+# Fits the cuts of every depth from ProbCut.MIN_DEPTH to max_depth on self-play positions of the agent
+def calibrate(agent: Agent, num_games: int, max_depth: int, threshold: float, progress: bool = False) -> ProbCut:
+    positions = generate_positions(agent, num_games, max_depth)
+
+    # Scores at every depth of the positions of each stage
+    stage_scores: Dict[int, List[List[float]]] = {}
+    for index, state in enumerate(positions):
+        empty_cells = State.SIZE * State.SIZE - state.black_disks() - state.white_disks()
+        stage_scores.setdefault(ProbCut.stage(empty_cells), []).append(search_scores(agent, state, max_depth))
+        if progress and (index + 1) % 100 == 0:
+            print(f'{index + 1} of {len(positions)} positions searched')
+
+    cuts = {}
+    for stage, scores in stage_scores.items():
+        if len(scores) < ProbCut.MIN_SAMPLES:
+            continue
+        for depth in range(ProbCut.MIN_DEPTH, max_depth + 1):
+            for shallow_depth in ProbCut.shallow_depths(depth):
+                cut = fit(shallow_depth, [(score[shallow_depth - 1], score[depth - 1]) for score in scores])
+                if cut is not None:
+                    cuts.setdefault((depth, stage), []).append(cut)
+
+    return ProbCut(cuts, threshold, str(agent))
+
+
+# Fits ProbCut parameters for an evaluation function offline
+if __name__ == '__main__':
+    from registry import AGENT_CHOICES
+
+    parser = argparse.ArgumentParser(prog = 'Reversi AI ProbCut calibration')
+    parser.add_argument('output')
+    parser.add_argument('-a', '--agent', default = 'superior', choices = AGENT_CHOICES)
+    parser.add_argument('-d', '--depth', type = int, default = 6)
+    parser.add_argument('-g', '--games', type = int, default = 20)
+    parser.add_argument('-t', '--threshold', type = float, default = 1.0)
+    parser.add_argument('--seed', type = int, default = 0)
+
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    start_time = time.time()
+    probcut = calibrate(AGENT_CHOICES[args.agent](), args.games, args.depth, args.threshold, progress = True)
+    probcut.save(args.output)
+
+    print(f'Wrote {sum(len(cuts) for cuts in probcut.cuts.values())} cuts to {args.output} in {round(time.time() - start_time)} seconds')
@@ -0,0 +1,93 @@
+import importlib
+from importlib.metadata import entry_points
+from typing import Callable, Dict, Iterator, Mapping, Union
+
+from agents import Agent
+
+# A zero-argument callable (usually an Agent subclass) that builds an agent
+AgentFactory = Callable[[], Agent]
+
+# Entry point group through which installed packages can add agents
+ENTRY_POINT_GROUP = 'reversi_ai.agents'
+
+# Built-in agents by command line name, as "module:attribute" import paths
+BUILTIN_AGENTS = {
+    'manual': 'agents:ManualAgent',
+    'random': 'agents:Agent',
+    'most_disks': 'agents:MostDisksAgent',
+    'mobility': 'agents:MobilityAgent',
+    'positional': 'agents:PositionalAgent',
+    'stability': 'agents:StabilityAgent',
+    'radius': 'agents:RadiusAgent',
+    'neural': 'deepLearningAgents:NeuralNetworkAgent',
+    'neural_numpy': 'deepLearningAgents:NumpyNeuralNetworkAgent',
+    'superior': 'agents:SuperiorAgent',
+    'mcts': 'mcts:MCTSAgent',
+}
+
+
+# A mapping from agent names to agent factories that only imports an agent's module when that agent is looked up,
+# so that selecting a lightweight agent never pays for importing a heavy one (such as TensorFlow)
+# Agents from installed packages are discovered through the reversi_ai.agents entry point group
+class AgentRegistry(Mapping[str, AgentFactory]):
+    def __init__(self, agents: Dict[str, str] = BUILTIN_AGENTS) -> None:
+        # Import paths, entry points or factories by name, and the factories loaded so far
+        self.sources: Dict[str, object] = dict(agents)
+        self.factories: Dict[str, AgentFactory] = {}
+        self.entry_points_loaded = False
+
+    # Registers an agent under the given name, either as a factory or as a "module:attribute" import path
+    def register(self, name: str, agent: Union[str, AgentFactory]) -> None:
+        self.sources[name] = agent
+        self.factories.pop(name, None)
+
+    def __getitem__(self, name: str) -> AgentFactory:
+        if name in self.factories:
+            return self.factories[name]
+
+        if name not in self.sources:
+            self.load_entry_points()
+        if name not in self.sources:
+            raise KeyError(name)
+
+        factory = AgentRegistry.load(self.sources[name])
+        self.factories[name] = factory
+        return factory
+
+    def __contains__(self, name: object) -> bool:
+        if name not in self.sources:
+            self.load_entry_points()
+        return name in self.sources
+
+    def __iter__(self) -> Iterator[str]:
+        self.load_entry_points()
+        return iter(self.sources)
+
+    def __len__(self) -> int:
+        self.load_entry_points()
+        return len(self.sources)
+
+    # Adds the agents advertised by installed packages; built-in and registered names take precedence
+    def load_entry_points(self) -> None:
+        if self.entry_points_loaded:
+            return
+
+        self.entry_points_loaded = True
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            self.sources.setdefault(entry_point.name, entry_point)
+
+    # Resolves an import path or entry point to the factory it names
+    @staticmethod
+    def load(source: object) -> AgentFactory:
+        if isinstance(source, str):
+            module_name, attribute = source.split(':')
+            return getattr(importlib.import_module(module_name), attribute)
+
+        if hasattr(source, 'load'):
+            return source.load()
+
+        return source
+
+
+# The agents that can be selected on the command line
+AGENT_CHOICES = AgentRegistry()
@@ -0,0 +1,70 @@
+import pygame
+from typing import List
+
+from constants import RED, BLACK, WHITE, DARK_GREEN, WINDOW_HEIGHT, WINDOW_WIDTH
+from model import Coordinate, State
+
+# Draws Reversi game states in a pygame window
+class Renderer:
+    # GUI elements
+    CELL_SIZE = WINDOW_HEIGHT // State.SIZE
+    PADDING = 10
+    VALID_MOVE_DOT_SIZE = CELL_SIZE / 10
+
+    def __init__(self, window: pygame.Surface) -> None:
+        self.window = window
+
+    """ STATIC METHODS """
+
+    @staticmethod
+    def get_coordinate_from_position(position: Coordinate) -> Coordinate:
+        x_coord, y_coord = position
+        return x_coord // Renderer.CELL_SIZE, y_coord // Renderer.CELL_SIZE
+
+    @staticmethod
+    def get_position_from_coordinate(row_index: int, col_index: int) -> Coordinate:
+        x_coord = row_index * Renderer.CELL_SIZE + Renderer.CELL_SIZE // 2
+        y_coord = col_index * Renderer.CELL_SIZE + Renderer.CELL_SIZE // 2
+        return x_coord, y_coord
+
+    """ PAINT METHODS """
+
+    def repaint(self, state: State) -> None:
+        self.__repaint_board(state)
+        self.__repaint_valid_moves(state.valid_moves())
+        pygame.display.update()
+
+    def __repaint_board(self, state: State) -> None:
+        self.__repaint_background()
+
+        board = state.board
+        for row in range(State.SIZE):
+            for col in range(State.SIZE):
+                cell = board[row][col]
+                self.__repaint_piece(row, col, cell)
+
+    def __repaint_background(self) -> None:
+        self.window.fill(DARK_GREEN)
+
+        for row_index in range(State.SIZE):
+            start_pos = (0, row_index * Renderer.CELL_SIZE)
+            end_pos = (WINDOW_WIDTH, row_index * Renderer.CELL_SIZE)
+            pygame.draw.line(self.window, BLACK, start_pos, end_pos, width=3)
+
+        for col_index in range(State.SIZE):
+            start_pos = (col_index * Renderer.CELL_SIZE, 0)
+            end_pos = (col_index * Renderer.CELL_SIZE, WINDOW_HEIGHT)
+            pygame.draw.line(self.window, BLACK, start_pos, end_pos, width=3)
+
+    def __repaint_piece(self, row: int, col: int, cell: int) -> None:
+        if cell == 0:
+            return
+
+        radius = (Renderer.CELL_SIZE - 2 * Renderer.PADDING) // 2
+        piece_color = BLACK if cell == State.BLACK else WHITE
+        piece_position = Renderer.get_position_from_coordinate(row, col)
+        pygame.draw.circle(self.window, piece_color, piece_position, radius)
+
+    def __repaint_valid_moves(self, valid_moves: List[Coordinate]) -> None:
+        for row_index, col_index in valid_moves:
+            pygame.draw.circle(self.window, RED, Renderer.get_position_from_coordinate(row_index, col_index), self.VALID_MOVE_DOT_SIZE)
@@ -0,0 +1,77 @@
+from typing import List, Tuple
+
+from bitboard import flip_rows, mirror_columns, transpose
+from model import Coordinate, State
+
+# The eight symmetries of the board, numbered so that transform t applies, in order:
+#   bit 2: transpose (swap rows and columns)
+#   bit 0: mirror the columns
+#   bit 1: flip the rows
+# Symmetric positions have the same value, and a move in one maps to the matching move in the other
+IDENTITY = 0
+NUM_TRANSFORMS = 8
+
+
+# Returns the eight images of a bitboard, indexed by transform
+def transform_all(bits: int) -> List[int]:
+    images = []
+
+    for image in (bits, transpose(bits)):
+        mirrored = mirror_columns(image)
+        images.extend((image, mirrored, flip_rows(image), flip_rows(mirrored)))
+
+    return images
+
+
+# Returns the image of a bitboard under the transform
+def transform_bits(bits: int, transform: int) -> int:
+    if transform & 4:
+        bits = transpose(bits)
+    if transform & 1:
+        bits = mirror_columns(bits)
+    if transform & 2:
+        bits = flip_rows(bits)
+    return bits
+
+
+# Returns the cell that the transform moves the given cell to
+def transform_action(action: Coordinate, transform: int) -> Coordinate:
+    row, column = action
+    if transform & 4:
+        row, column = column, row
+    if transform & 1:
+        column = State.SIZE - 1 - column
+    if transform & 2:
+        row = State.SIZE - 1 - row
+    return row, column
+
+
+# The transform that undoes each transform
+INVERSE = [next(inverse for inverse in range(NUM_TRANSFORMS)
+                if transform_action(transform_action((0, 1), transform), inverse) == (0, 1))
+           for transform in range(NUM_TRANSFORMS)]
+
+
+# Returns the canonical black and white bitboards among the eight images of a position, and the transform
+# that produces them: the image with the smallest black bitboard, then the smallest white bitboard
+def canonical_bitboards(black: int, white: int) -> Tuple[int, int, int]:
+    images = [(black_image << 64) | white_image
+              for black_image, white_image in zip(transform_all(black), transform_all(white))]
+    key = min(images)
+    return key >> 64, key & 0xFFFFFFFFFFFFFFFF, images.index(key)
+
+
+# Returns the canonical form of the state and the transform that maps the state onto it
+# Moves in the state map to moves in the canonical state with transform_action(action, transform),
+# and back with transform_action(action, INVERSE[transform])
+def canonicalize(state: State) -> Tuple[State, int]:
+    black, white, transform = canonical_bitboards(state.black, state.white)
+    if transform == IDENTITY:
+        return state, IDENTITY
+    return State.from_bitboards(black, white, turn=state.turn()), transform
+
+
+# Returns a key shared by the state and all of its symmetric images, and by no other position
+def canonical_key(state: State) -> int:
+    black, white, _ = canonical_bitboards(state.black, state.white)
+    return (black << 65) | (white << 1) | (state.turn() == State.WHITE)
@@ -1,7 +1,33 @@
+import benchmark
+import contextlib
+import bitboard
+import encoding
+import features
+import gameClock
+import importlib.util
+import instrumentation
+import io
+import mcts
+import numpy as np
+import openingBook
+import os
+import probcut
+import random
+import symmetry
+import tempfile
+import time
 import unittest
-from agents import MostDisksAgent, StabilityAgent
-from minimax import MinimaxAgent
-from model import State
+import zobrist
+from agents import ManualAgent, MostDisksAgent, PositionalAgent, RadiusAgent, StabilityAgent, SuperiorAgent
+from endgame import EndgameSolver, SolverTimeout
+from evaluationCache import CachedAgent
+from main import Main
+from minimax import ALGORITHMS, MTDF, MinimaxAgent
+from model import SearchState, State
+from numpyModel import NumpyModel
+from parallel import ParallelMinimaxAgent
+from pondering import PonderingAgent
+from registry import AgentRegistry
 
 # Testing class for Reversi state
 class TestReversiState(unittest.TestCase):
@@ -10,6 +36,222 @@ class TestReversiState(unittest.TestCase):
 
         self.assertEqual(State.BLACK, state.board[3][3])
 
+    def test_valid_moves(self):
+        state = State()
+
+        self.assertEqual([(2, 4), (3, 5), (4, 2), (5, 3)], state.valid_moves())
+        self.assertEqual([4, 12, 56, 244, 1396], [self.perft(state, depth) for depth in range(1, 6)])
+
+    def test_place_disk(self):
+        state = State().place_disk((2, 4))
+
+        self.assertEqual(State.BLACK, state.board[3][4])
+        self.assertEqual(4, state.black_disks())
+        self.assertEqual(1, state.white_disks())
+        self.assertEqual(State.WHITE, state.turn())
+        self.assertRaises(ValueError, state.place_disk, (0, 0))
+
+    def test_value_semantics(self):
+        state = State()
+        child = state.place_disk((2, 4))
+
+        self.assertEqual(State(), state)
+        self.assertEqual(State(child.board), child)
+        self.assertEqual(1, len({child, State(child.board)}))
+        self.assertRaises(AttributeError, setattr, state, 'window', None)
+
+        search_state = SearchState(state)
+        search_state.make_move((2, 4))
+        self.assertEqual(child, search_state.freeze())
+        self.assertRaises(TypeError, hash, search_state)
+
+    def test_make_move_undo_move(self):
+        state = SearchState(State())
+        start = state.board
+
+        state.make_move((2, 4))
+        state.make_move((2, 3))
+        self.assertEqual(State().place_disk((2, 4)).place_disk((2, 3)).board, state.board)
+
+        state.undo_move()
+        state.undo_move()
+        self.assertEqual(start, state.board)
+        self.assertRaises(ValueError, state.undo_move)
+        self.assertRaises(ValueError, state.make_move, (0, 0))
+
+    def test_zobrist_key(self):
+        state = SearchState(State())
+        key = state.zobrist_key
+
+        state.make_move((2, 4))
+        state.make_move((2, 3))
+        self.assertEqual(zobrist.hash_bitboards(state.black, state.white), state.zobrist_key)
+        self.assertEqual(State(state.board).zobrist_key, state.zobrist_key)
+
+        state.undo_move()
+        state.undo_move()
+        self.assertEqual(key, state.zobrist_key)
+
+    def test_pass(self):
+        board = [[1, 2, 0, 2, 0, 0, 0, 0]] + [[0] * State.SIZE for _ in range(State.SIZE - 1)]
+        state = SearchState(State(board, turn=State.BLACK))
+
+        # White cannot reply to (0, 2), so black moves again
+        state.make_move((0, 2))
+        self.assertEqual(State.BLACK, state.turn())
+        self.assertTrue(state.passed)
+        self.assertFalse(state.game_over())
+        self.assertEqual([(0, 4)], state.valid_moves())
+        self.assertEqual(zobrist.hash_bitboards(state.black, state.white, True), state.zobrist_key)
+        self.assertEqual(3, state.black_disks())
+
+        state.make_move((0, 4))
+        self.assertTrue(state.game_over())
+
+        state.undo_move()
+        state.undo_move()
+        self.assertEqual(State(board, turn=State.BLACK).zobrist_key, state.zobrist_key)
+
+        # Three disks means white to move, but white has no moves
+        self.assertEqual(State.BLACK, State(board).turn())
+
+    def test_is_disk_vulnerable(self):
+        state = State().place_disk((2, 4))
+
+        # White can flip (3, 4) by playing (2, 5), but no line through (2, 4) holds a white disk
+        self.assertTrue(state.is_disk_vulnerable((3, 4)))
+        self.assertTrue(state.is_disk_vulnerable((4, 4)))
+        self.assertFalse(state.is_disk_vulnerable((2, 4)))
+        self.assertFalse(state.is_disk_vulnerable((0, 0)))
+
+    def test_stable_disks(self):
+        rng = random.Random(18)
+
+        for _ in range(20):
+            states = [State()]
+            while not states[-1].game_over():
+                states.append(states[-1].place_disk(rng.choice(states[-1].valid_moves())))
+
+            for state in states:
+                stable = state.stable_disks()
+                # Stable disks can never be flipped, neither by the next move nor by the end of the game
+                self.assertEqual(0, stable & state.vulnerable_disks())
+                self.assertEqual(stable & state.black, stable & states[-1].black)
+                self.assertEqual(stable & state.white, stable & states[-1].white)
+
+        # A corner and the full row next to it
+        state = State([[1, 2, 0, 0, 0, 0, 0, 0],
+                       [1, 1, 2, 1, 2, 2, 1, 2],
+                       [0, 0, 1, 0, 0, 0, 0, 0],
+                       [0, 0, 0, 0, 0, 0, 0, 0],
+                       [0, 0, 0, 0, 0, 0, 0, 0],
+                       [0, 0, 0, 0, 0, 0, 0, 0],
+                       [0, 0, 0, 0, 0, 0, 0, 0],
+                       [0, 0, 0, 0, 0, 0, 0, 0]])
+        self.assertTrue(state.is_disk_stable((0, 0)))
+        self.assertTrue(state.is_disk_stable((1, 0)))
+        self.assertFalse(state.is_disk_stable((0, 1)))
+        self.assertFalse(state.is_disk_stable((1, 2)))
+
+    # Counts the leaf nodes of the game tree to the given depth
+    def perft(self, state: State, depth: int) -> int:
+        if depth == 0:
+            return 1
+        return sum(self.perft(state.place_disk(move), depth - 1) for move in state.valid_moves())
+
+# Testing class for the vectorized neural network input encoder
+class TestEncoding(unittest.TestCase):
+    def test_encode_states(self):
+        states = [State(), State().place_disk((2, 4))]
+        planes = encoding.encode_states(states, vulnerable=True)
+
+        self.assertEqual((2, 4, State.SIZE, State.SIZE), planes.shape)
+        self.assertFalse(encoding.encode_states(states)[:, 3].any())
+        self.assertTrue((encoding.encode_states(states)[:, :3] == planes[:, :3]).all())
+        for state, state_planes in zip(states, planes):
+            board = state.board
+            for row in range(State.SIZE):
+                for col in range(State.SIZE):
+                    self.assertEqual(board[row][col] == State.BLACK, state_planes[0][row][col])
+                    self.assertEqual(board[row][col] == State.WHITE, state_planes[1][row][col])
+                    self.assertEqual(state.is_valid_move((row, col)), state_planes[2][row][col])
+                    self.assertEqual(state.is_disk_vulnerable((row, col)), state_planes[3][row][col])
+
+    def test_get_flips(self):
+        rng = random.Random(21)
+        states = [State()]
+        while not states[-1].game_over():
+            states.append(states[-1].place_disk(rng.choice(states[-1].valid_moves())))
+        states.pop()
+
+        moves = [bitboard.square(*rng.choice(state.valid_moves())) for state in states]
+        players, opponents = zip(*(state.players() for state in states))
+        flips = encoding.get_flips(np.array(players, dtype=np.uint64), np.array(opponents, dtype=np.uint64),
+                                   np.array(moves, dtype=np.uint64))
+
+        self.assertEqual([bitboard.get_flips(player, opponent, move) for player, opponent, move in zip(players, opponents, moves)],
+                         flips.tolist())
+
+# Testing class for the feature extractor
+class TestFeatures(unittest.TestCase):
+    def test_extract(self):
+        state = State([[1, 1, 1, 1, 2, 0, 2, 2],
+                       [1, 1, 1, 0, 2, 0, 2, 2],
+                       [2, 2, 2, 2, 2, 0, 2, 2],
+                       [0, 0, 1, 1, 1, 0, 0, 2],
+                       [1, 2, 1, 1, 2, 0, 1, 2],
+                       [1, 1, 1, 0, 0, 1, 0, 1],
+                       [1, 1, 1, 0, 2, 0, 1, 1],
+                       [1, 1, 1, 2, 1, 1, 1, 1]])
+        state_features = features.extract(state)
+
+        self.assertEqual((state.black_disks(), state.white_disks()), (state_features.black_disks, state_features.white_disks))
+        self.assertEqual((3, 1), (state_features.black_corners, state_features.white_corners))
+        self.assertEqual(PositionalAgent().evaluate(state), state_features.positional)
+        self.assertEqual((23, 9), (state_features.black_stable, state_features.white_stable))
+
+    def test_extract_batch(self):
+        states = [State()]
+        rng = random.Random(17)
+        while not states[-1].game_over():
+            states.append(states[-1].place_disk(rng.choice(states[-1].valid_moves())))
+
+        batch_features = features.extract_batch(states)
+        for index, state in enumerate(states):
+            self.assertEqual(features.extract(state), features.Features(*(field[index] for field in batch_features)))
+
+# Testing class for the TensorFlow-free neural network implementation
+class TestNumpyModel(unittest.TestCase):
+    MODEL_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'models', '1000_normalized.h5')
+
+    def setUp(self):
+        state = State()
+        self.states = [state]
+        for _ in range(20):
+            state = state.place_disk(state.valid_moves()[-1])
+            self.states.append(state)
+        self.inputs = encoding.encode_states(self.states)
+
+    @unittest.skipUnless(importlib.util.find_spec('h5py'), "h5py is not installed")
+    def test_npz_cache(self):
+        model = NumpyModel.from_h5(TestNumpyModel.MODEL_PATH)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'model.npz')
+            model.save_npz(path)
+            cached_model = NumpyModel.load(path)
+
+        np.testing.assert_array_equal(model(self.inputs), cached_model(self.inputs))
+
+    @unittest.skipUnless(importlib.util.find_spec('tensorflow'), "TensorFlow is not installed")
+    def test_matches_keras(self):
+        import tensorflow.keras.models as models
+
+        keras_model = models.load_model(TestNumpyModel.MODEL_PATH)
+        model = NumpyModel.from_h5(TestNumpyModel.MODEL_PATH)
+
+        np.testing.assert_allclose(np.asarray(keras_model(self.inputs)), model(self.inputs), atol=1e-5)
+
 # Testing class for Reversi move agents (test may fail because it's non-deterministic)
 class TestReversiAgents(unittest.TestCase):
     def test_most_disks_agent(self):
@@ -42,6 +284,539 @@ class TestMinimaxAgent(unittest.TestCase):
 
         self.assertEqual((0, 2), agent.get_action(state))
 
+    def test_transposition_table(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        scores = []
+
+        for table_memory in [0, 1]:
+            agent = MinimaxAgent(MostDisksAgent(), 4, table_memory)
+            agent.get_action(state)
+            scores.append(agent.score)
+
+        self.assertEqual(scores[0], scores[1])
+
+        move = agent.get_action(state)
+        hits = agent.table.hits
+        self.assertEqual(move, agent.get_action(state))
+        self.assertEqual(hits + 1, agent.table.hits)
+
+    def test_batch_evaluation(self):
+        class BatchedMostDisksAgent(MostDisksAgent):
+            batch_evaluation = True
+
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        agent = MinimaxAgent(MostDisksAgent(), 3, 0)
+        batched_agent = MinimaxAgent(BatchedMostDisksAgent(), 3, 0)
+
+        self.assertEqual(agent.get_action(state), batched_agent.get_action(state))
+        self.assertEqual(agent.score, batched_agent.score)
+
+    def test_batch_evaluation_deadline(self):
+        # A slow batched evaluator, whose batches count as many nodes at once, still stops close to the deadline
+        class SlowBatchedAgent(SuperiorAgent):
+            batch_evaluation = True
+
+            def evaluate_batch(self, states):
+                time.sleep(0.002)
+                return super().evaluate_batch(states)
+
+        for moves in benchmark.MIDGAME_POSITIONS:
+            state = benchmark.play_moves(moves)
+            agent = MinimaxAgent(SlowBatchedAgent(), 64, time_limit=200)
+            start_time = time.perf_counter()
+            self.assertIn(agent.get_action(state), state.valid_moves())
+            self.assertLess(time.perf_counter() - start_time, 0.25)
+
+    def test_iterative_deepening(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        fixed_depth_agent = MinimaxAgent(SuperiorAgent(), 3, 0)
+        fixed_depth_agent.get_action(state)
+
+        agent = MinimaxAgent(SuperiorAgent(), 3, time_limit=60000)
+        agent.get_action(state)
+
+        self.assertEqual(3, agent.depth_reached)
+        self.assertEqual(fixed_depth_agent.score, agent.score)
+        self.assertEqual(3, len(agent.principal_variation))
+
+        agent = MinimaxAgent(SuperiorAgent(), None, time_limit=1)
+        self.assertIn(agent.get_action(state), state.valid_moves())
+
+    def test_endgame_solver(self):
+        state = State()
+        rng = random.Random(12)
+        while state.black_disks() + state.white_disks() < 56:
+            state = state.place_disk(rng.choice(state.valid_moves()))
+
+        # With every empty cell searched, minimax on the disk count is exact
+        full_depth_agent = MinimaxAgent(MostDisksAgent(), 8, 0)
+        full_depth_agent.get_action(state)
+
+        agent = MinimaxAgent(SuperiorAgent(), 2, endgame_empties=8)
+        self.assertIn(agent.get_action(state), state.valid_moves())
+        self.assertEqual(full_depth_agent.score, agent.score)
+        self.assertEqual(8, agent.depth_reached)
+
+    def test_endgame_solver_deadline(self):
+        # The last empty cells count their nodes without checking the clock, and the solver still stops in time
+        for seed in range(4):
+            state = State()
+            rng = random.Random(seed)
+            while state.black_disks() + state.white_disks() < 44:
+                state = state.place_disk(rng.choice(state.valid_moves()))
+
+            solver = EndgameSolver()
+            start_time = time.perf_counter()
+            with self.assertRaises(SolverTimeout):
+                solver.solve(*state.players(), start_time + 0.1)
+            self.assertLess(time.perf_counter() - start_time, 0.2)
+
+    def test_search_algorithms(self):
+        rng = random.Random(19)
+
+        for plies in (6, 20, 40):
+            state = State()
+            for _ in range(plies):
+                state = state.place_disk(rng.choice(state.valid_moves()))
+
+            agent = MinimaxAgent(SuperiorAgent(), 4, 0)
+            agent.get_action(state)
+
+            for algorithm in ALGORITHMS:
+                algorithm_agent = MinimaxAgent(SuperiorAgent(), 4, algorithm=algorithm)
+                action = algorithm_agent.get_action(state)
+                self.assertEqual(agent.score, algorithm_agent.score)
+
+                # Ties may be broken differently, but the chosen move must have the same value
+                successor_agent = MinimaxAgent(SuperiorAgent(), 3, 0)
+                successor_agent.get_action(state.place_disk(action))
+                self.assertEqual(agent.score, successor_agent.score)
+
+        with self.assertRaises(ValueError):
+            MinimaxAgent(SuperiorAgent(), 4, 0, algorithm=MTDF)
+
+    def test_instrumentation(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        agent = MinimaxAgent(SuperiorAgent(), 4)
+        instrumented_agent = MinimaxAgent(SuperiorAgent(), 4)
+        instrumented_agent.instrument()
+
+        self.assertEqual(agent.get_action(state), instrumented_agent.get_action(state))
+        self.assertEqual([], agent.take_move_records())
+
+        instrumented_agent.get_action(state.place_disk((2, 2)))
+        records = instrumented_agent.take_move_records()
+        self.assertEqual(2, len(records))
+        self.assertEqual([], instrumented_agent.take_move_records())
+
+        record = records[0]
+        self.assertEqual(4, record['depth'])
+        self.assertEqual(agent.nodes, record['nodes'])
+        self.assertLessEqual(record['first_move_cutoffs'], record['cutoffs'])
+        self.assertLessEqual(record['cutoffs'], record['interior_nodes'])
+        self.assertGreater(record['branching_factor'], 1)
+        self.assertGreater(record['evaluate_time'], 0)
+        self.assertLess(record['evaluate_time'] + record['make_move_time'], record['time'])
+
+        totals = instrumentation.aggregate(records)
+        self.assertEqual(2, totals['moves'])
+        self.assertEqual(records[0]['nodes'] + records[1]['nodes'], totals['nodes'])
+        self.assertAlmostEqual(totals['branches'] / totals['interior_nodes'], totals['branching_factor'])
+
+        # A depth 0 move is recorded without the counters of the search before it
+        instrumented_agent.depth = 0
+        instrumented_agent.get_action(state)
+        record = instrumented_agent.take_move_records()[0]
+        self.assertEqual(0, record['nodes'])
+        self.assertEqual(0, record['depth'])
+        self.assertEqual(0, record['interior_nodes'])
+
+# Testing class for Multi-ProbCut
+class TestProbCut(unittest.TestCase):
+    def test_fit(self):
+        rng = random.Random(20)
+        samples = [(shallow, 2 * shallow + 3 + rng.gauss(0, 1)) for shallow in range(100)]
+        cut = probcut.fit(2, samples)
+
+        self.assertAlmostEqual(2, cut.slope, places=1)
+        self.assertAlmostEqual(1, cut.error, delta=0.3)
+        self.assertIsNone(probcut.fit(2, [(1, 1), (1, 2)]))
+
+    def test_search(self):
+        state = State()
+        rng = random.Random(20)
+        for _ in range(16):
+            state = state.place_disk(rng.choice(state.valid_moves()))
+
+        exact_agent = MinimaxAgent(SuperiorAgent(), 4)
+        exact_action = exact_agent.get_action(state)
+
+        # Cuts whose error is too large to ever cut leave the search unchanged
+        cuts = {(depth, stage): [probcut.Cut(depth - 2, 1, 0, 1e9)] for depth in range(3, 5) for stage in range(7)}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'probcut.json')
+            probcut.ProbCut(cuts).save(path)
+            parameters = probcut.ProbCut.load(path)
+        self.assertEqual(cuts, parameters.cuts)
+
+        agent = MinimaxAgent(SuperiorAgent(), 4, probcut=parameters)
+        self.assertEqual(exact_action, agent.get_action(state))
+        self.assertEqual(exact_agent.score, agent.score)
+        self.assertEqual(0, agent.statistics()['probcut_cuts'])
+
+        # Cuts that trust the shallow search completely cut most nodes, but still play a valid move
+        cuts = {key: [cut._replace(error=0)] for key, [cut] in cuts.items()}
+        agent = MinimaxAgent(SuperiorAgent(), 4, probcut=probcut.ProbCut(cuts))
+        self.assertIn(agent.get_action(state), state.valid_moves())
+        self.assertGreater(agent.statistics()['probcut_cuts'], 0)
+        self.assertLess(agent.nodes, exact_agent.nodes)
+
+# Testing class for the Monte Carlo tree search agent
+class TestMCTSAgent(unittest.TestCase):
+    def test_playout(self):
+        state = State()
+        rng = random.Random(21)
+        while state.black_disks() + state.white_disks() < 62:
+            state = state.place_disk(rng.choice(state.valid_moves()))
+        final_states = [state.place_disk(action) for action in state.valid_moves()]
+        final_states = [final_state.place_disk(final_state.valid_moves()[0]) if not final_state.game_over() else final_state
+                        for final_state in final_states]
+
+        # With two empty cells left, every playout ends in one of the games above
+        black, white, black_to_move = encoding.to_arrays([state] * 50)
+        differentials = mcts.playout(black, white, black_to_move, np.random.default_rng(21))
+        self.assertLessEqual(set(differentials.tolist()),
+                             {final_state.black_disks() - final_state.white_disks() for final_state in final_states})
+
+    def test_tree_reuse(self):
+        random.seed(21)
+        agent = mcts.MCTSAgent(2000)
+        state = State()
+
+        for _ in range(3):
+            action = agent.get_action(state)
+            self.assertIn(action, state.valid_moves())
+            state = state.place_disk(action)
+            state = state.place_disk(state.valid_moves()[0])
+
+        self.assertEqual({'playouts': 6000, 'tree_reuse_hits': 2, 'tree_reuse_misses': 1}, agent.statistics())
+        # The subtree kept from the last search holds the playouts through the move played
+        self.assertGreater(agent.root.visits, 0)
+
+    def test_budget(self):
+        for playouts in (0, -5):
+            with self.assertRaises(ValueError):
+                mcts.MCTSAgent(playouts)
+
+        # A search that never runs a batch still plays a valid move
+        agent = mcts.MCTSAgent(100)
+        agent.search = lambda root, deadline=None: None
+        self.assertIn(agent.get_action(State()), State().valid_moves())
+        self.assertIsNone(agent.root)
+
+# Testing class for the benchmarks
+class TestBenchmark(unittest.TestCase):
+    def test_perft(self):
+        for depth in range(1, 7):
+            self.assertEqual(benchmark.PERFT_COUNTS[depth], benchmark.perft(SearchState(State()), depth))
+
+        # One of the shortest games, which is over after nine plies, is a single leaf however deep the count goes
+        state = benchmark.play_moves('e3d3c2f2e2f3c5d2g2')
+        self.assertTrue(state.game_over())
+        self.assertEqual(1, benchmark.perft(SearchState(state), 3))
+
+    def test_find_regressions(self):
+        baseline = {'perft_8_time': 1.0, 'search_4_nodes': 1000}
+        self.assertEqual([], benchmark.find_regressions({'perft_8_time': 1.2, 'search_4_nodes': 900}, baseline))
+        self.assertEqual([('search_4_nodes', 1001, 1000)],
+                         benchmark.find_regressions({'search_4_nodes': 1001, 'valid_moves_time': 1.0}, baseline))
+
+        # Timings are only compared on request, within the threshold
+        results = {'perft_8_time': 1.3, 'search_4_nodes': 1000}
+        self.assertEqual([], benchmark.find_regressions(results, baseline))
+        self.assertEqual([], benchmark.find_regressions(results, baseline, 0.5, timings=True))
+        self.assertEqual([('perft_8_time', 1.3, 1.0)], benchmark.find_regressions(results, baseline, timings=True))
+
+# Testing class for the pondering agent
+class TestPonderingAgent(unittest.TestCase):
+    def test_hit_and_miss(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        agent = PonderingAgent(MinimaxAgent(SuperiorAgent(), 3))
+
+        action = agent.get_action(state)
+        agent.thread.join()
+        ponder_state = agent.ponder_state
+        next_state = state.place_disk(action)
+        self.assertIn(ponder_state, [next_state.place_disk(reply) for reply in next_state.valid_moves()])
+        self.assertIsNotNone(agent.ponder_action)
+
+        # The background search finds the value of the position the agent would find on its turn
+        expected_agent = MinimaxAgent(SuperiorAgent(), 3)
+        expected_agent.get_action(ponder_state)
+        self.assertEqual(expected_agent.score, agent.agent.score)
+
+        # On a hit, the move found in the background is played without searching again
+        ponder_action = agent.ponder_action
+        self.assertEqual(ponder_action, agent.get_action(ponder_state))
+        self.assertEqual(1, agent.ponder_hits)
+
+        other_state = State().place_disk((3, 5))
+        self.assertIn(agent.get_action(other_state), other_state.valid_moves())
+        self.assertEqual(1, agent.ponder_misses)
+        agent.close()
+
+    def test_stop(self):
+        state = State().place_disk((2, 4))
+        agent = PonderingAgent(MinimaxAgent(SuperiorAgent(), 12, 0))
+        agent.start_pondering(state, state.valid_moves()[0])
+
+        start_time = time.perf_counter()
+        agent.close()
+        self.assertLess(time.perf_counter() - start_time, 1)
+        self.assertIsNone(agent.ponder_action)
+
+    def test_records_hits(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        agent = PonderingAgent(MinimaxAgent(SuperiorAgent(), 3))
+        agent.instrument()
+
+        agent.get_action(state)
+        agent.thread.join()
+        self.assertEqual(1, len(agent.take_move_records()))
+
+        # The move found in the background is recorded with the search that found it
+        agent.get_action(agent.ponder_state)
+        records = agent.take_move_records()
+        self.assertEqual(1, agent.ponder_hits)
+        self.assertEqual(1, len(records))
+        self.assertEqual(3, records[0]['depth'])
+        self.assertGreater(records[0]['nodes'], 0)
+        agent.close()
+
+    def test_book_hit_stops_pondering(self):
+        entries = openingBook.generate(MostDisksAgent(), 2, 2, 1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            openingBook.OpeningBook.write(path, entries)
+            pondering_agent = PonderingAgent(MinimaxAgent(SuperiorAgent(), 3))
+            agent = openingBook.BookAgent(pondering_agent, openingBook.OpeningBook(path))
+
+            # Out of the book, the agent ponders after its move, and a book move stops the background search
+            state = State().place_disk((2, 4)).place_disk((2, 3)).place_disk((2, 2))
+            agent.get_action(state)
+            self.assertIsNotNone(pondering_agent.thread)
+            agent.get_action(State())
+            self.assertIsNone(pondering_agent.thread)
+            agent.close()
+
+    def test_clock(self):
+        time_control = gameClock.TimeControl(10)
+        pondering_agent = PonderingAgent(MinimaxAgent(SuperiorAgent(), 2))
+        with self.assertRaises(ValueError):
+            Main(MostDisksAgent(), pondering_agent, 1, False, time_control=time_control)
+
+        # Against a human, pondering takes no time from the opponent's clock
+        Main(ManualAgent(), pondering_agent, 1, False, time_control=time_control)
+        Main(MostDisksAgent(), pondering_agent, 1, False)
+
+# Testing class for the parallel minimax agent
+class TestParallelMinimaxAgent(unittest.TestCase):
+    def test_matches_serial_search(self):
+        state = State()
+        for _ in range(8):
+            state = state.place_disk(state.valid_moves()[0])
+
+        serial_agent = MinimaxAgent(SuperiorAgent(), 3)
+        parallel_agent = ParallelMinimaxAgent(SuperiorAgent(), 3, workers=2)
+        try:
+            self.assertEqual(serial_agent.get_action(state), parallel_agent.get_action(state))
+            self.assertEqual(serial_agent.score, parallel_agent.score)
+        finally:
+            parallel_agent.close()
+
+    def test_matches_serial_search_options(self):
+        rng = random.Random(5)
+        state = State()
+        for _ in range(20):
+            state = state.place_disk(rng.choice(state.valid_moves()))
+
+        # ProbCut runs from the first ply below the root in the workers too, and MTD(f) starts from the score of
+        # the first move rather than from the previous move's score
+        cuts = probcut.ProbCut.load(os.path.join(os.path.dirname(__file__), 'models', 'probcut_superior.json'))
+        for algorithm, probcut_parameters in [('alphabeta', cuts), ('pvs', cuts), (MTDF, None)]:
+            serial_agent = MinimaxAgent(SuperiorAgent(), 5, algorithm=algorithm, probcut=probcut_parameters)
+            parallel_agent = ParallelMinimaxAgent(SuperiorAgent(), 5, algorithm=algorithm, probcut=probcut_parameters,
+                                                  workers=2)
+            try:
+                self.assertEqual(serial_agent.get_action(state), parallel_agent.get_action(state))
+                self.assertEqual(serial_agent.score, parallel_agent.score)
+            finally:
+                parallel_agent.close()
+
+# Testing class for the game clock
+class TestGameClock(unittest.TestCase):
+    def test_clock(self):
+        clock = gameClock.GameClock(gameClock.TimeControl(10, 1))
+        state = State()
+
+        deadline = clock.start(state)
+        self.assertLess(deadline - time.perf_counter(), 10)
+        self.assertFalse(clock.stop())
+        self.assertGreater(clock.remaining[State.BLACK], 10.9)
+        self.assertEqual(10, clock.remaining[State.WHITE])
+
+        clock.remaining[State.WHITE] = 0.001
+        clock.start(state.place_disk((2, 4)))
+        time.sleep(0.01)
+        self.assertTrue(clock.expired())
+        self.assertTrue(clock.stop())
+        self.assertEqual({'clock_time': clock.used[State.WHITE], 'clock_moves': 1, 'clock_overruns': 1},
+                         clock.statistics(State.WHITE))
+
+        # Time controls that cannot be played are rejected before any game starts
+        for time_control in [gameClock.TimeControl(0), gameClock.TimeControl(5, -10), gameClock.TimeControl(5, 0, 'pause')]:
+            with self.assertRaises(ValueError):
+                gameClock.GameClock(time_control)
+            with self.assertRaises(ValueError):
+                Main(MostDisksAgent(), MostDisksAgent(), 1, False, time_control=time_control)
+
+    def test_overrun(self):
+        class SlowAgent(MostDisksAgent):
+            def get_action(self, state, deadline=None):
+                time.sleep(0.02)
+                return super().get_action(state, deadline)
+
+        main = Main(SlowAgent(), MostDisksAgent(), 2, False, time_control=gameClock.TimeControl(0.05))
+        result = main.play_game(0, False)
+        self.assertEqual(State.WHITE, result.winner)
+        self.assertEqual(1, result.black_statistics['clock_overruns'])
+        self.assertEqual(0, result.white_statistics['clock_overruns'])
+
+        main = Main(SlowAgent(), MostDisksAgent(), 2, False,
+                    time_control=gameClock.TimeControl(0.05, overrun=gameClock.FALLBACK))
+        result = main.play_game(0, False)
+        self.assertEqual(1, result.black_statistics['clock_overruns'])
+        self.assertGreater(result.black_statistics['clock_moves'], 0)
+        self.assertLess(result.black_statistics['clock_moves'], 10)
+
+# Testing class for playing matches
+class TestMain(unittest.TestCase):
+    # Plays the match and returns the lines of the summary with the wins of each player and the ties
+    @staticmethod
+    def run_match(jobs):
+        agent_args = {'black_agent_args': ['random'], 'white_agent_args': ['most_disks']}
+        main = Main(*Main.get_agents(**agent_args), 6, False, jobs, 7, agent_args)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main.run_game(False)
+        return [line for line in output.getvalue().splitlines() if line.startswith(('Black (', 'White (', 'Ties'))]
+
+    def test_parallel_games(self):
+        # Every game is played with its own seed, so a seeded match has the same outcome in worker processes
+        serial_summary = TestMain.run_match(1)
+        self.assertEqual(3, len(serial_summary))
+        self.assertEqual(serial_summary, TestMain.run_match(2))
+
+        agent_args = {'black_agent_args': ['random'], 'white_agent_args': ['most_disks']}
+        main = Main(*Main.get_agents(**agent_args), 6, False, 1, 7, agent_args)
+        parallel_main = Main(*Main.get_agents(**agent_args), 6, False, 2, 7, agent_args)
+        self.assertEqual(sorted((result.seed, result.winner) for result in main.play_games(False)),
+                         sorted((result.seed, result.winner) for result in parallel_main.play_games_parallel()))
+
+# Testing class for the lazy agent registry
+class TestAgentRegistry(unittest.TestCase):
+    def test_lookup(self):
+        registry = AgentRegistry({'most_disks': 'agents:MostDisksAgent', 'missing': 'no_such_module:Agent'})
+
+        self.assertIs(MostDisksAgent, registry['most_disks'])
+        # Listing an agent does not import its module
+        self.assertIn('missing', registry)
+        self.assertRaises(ModuleNotFoundError, lambda: registry['missing'])
+        self.assertRaises(KeyError, lambda: registry['unknown'])
+
+        registry.register('superior', SuperiorAgent)
+        self.assertIs(SuperiorAgent, registry['superior'])
+
+# Testing class for the memory-mapped opening book
+class TestOpeningBook(unittest.TestCase):
+    def test_book_agent(self):
+        entries = openingBook.generate(MostDisksAgent(), 2, 2, 1)
+        state = State()
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'book.bin')
+            openingBook.OpeningBook.write(path, entries)
+            agent = openingBook.BookAgent(RadiusAgent(), openingBook.OpeningBook(path))
+
+            canonical_state, transform = symmetry.canonicalize(state)
+            self.assertEqual(len(entries), len(agent.book))
+            self.assertEqual(entries[canonical_state.zobrist_key], agent.book.lookup(canonical_state.zobrist_key))
+            self.assertEqual(symmetry.transform_action(entries[canonical_state.zobrist_key][0], symmetry.INVERSE[transform]),
+                             agent.get_action(state))
+            self.assertIsNone(agent.book.lookup(canonical_state.zobrist_key + 1))
+
+            # The four first moves are symmetric, so a single entry covers all of them
+            for action in state.valid_moves():
+                child = state.place_disk(action)
+                self.assertIn(agent.get_action(child), child.valid_moves())
+
+            state = state.place_disk((2, 4)).place_disk((2, 3)).place_disk((2, 2))
+            self.assertIn(agent.get_action(state), state.valid_moves())
+            self.assertEqual({'book_hits': 5, 'book_misses': 1}, agent.statistics())
+            agent.close()
+
+# Testing class for the evaluation cache
+class TestEvaluationCache(unittest.TestCase):
+    def test_cached_agent(self):
+        states = [State()] + [State().place_disk(action) for action in State().valid_moves()]
+        agent = SuperiorAgent()
+        cached_agent = CachedAgent(SuperiorAgent(), max_entries=4)
+
+        self.assertEqual([agent.evaluate(state) for state in states], cached_agent.evaluate_batch(states))
+        self.assertEqual(agent.evaluate_components(states[1]), list(cached_agent.evaluate_components(states[1])))
+        self.assertEqual(agent.evaluate(states[1]), cached_agent.evaluate(states[1]))
+
+        # The first state was evicted to make room for the fifth; the second was used since
+        self.assertEqual(4, len(cached_agent.cache))
+        self.assertEqual({'evaluation_cache_hits': 2, 'evaluation_cache_misses': 5}, cached_agent.statistics())
+        cached_agent.evaluate(states[1])
+        cached_agent.evaluate(states[0])
+        self.assertEqual({'evaluation_cache_hits': 3, 'evaluation_cache_misses': 6}, cached_agent.statistics())
+
+        # Looking up a position does not resolve its moves
+        cached_agent.evaluate(State().place_disk((2, 4)))
+        state = State().place_disk((2, 4))
+        self.assertEqual(agent.evaluate(State().place_disk((2, 4))), cached_agent.evaluate(state))
+        self.assertIsNone(state.moves)
+
+    def test_get_agent(self):
+        # Only the evaluation function of a minimax agent is cached; other agents keep their own tiebreaker
+        self.assertIsInstance(Main.get_agent(['radius'], evaluation_cache=16), RadiusAgent)
+        self.assertIsInstance(Main.get_agent(['minimax', 'radius', '2'], evaluation_cache=16).agent, CachedAgent)
+
+        cached_agent = CachedAgent(RadiusAgent())
+        random.seed(16)
+        expected = RadiusAgent().tiebreaker(State().valid_moves())
+        random.seed(16)
+        self.assertEqual(expected, cached_agent.tiebreaker(State().valid_moves()))
+
+# Testing class for board symmetries
+class TestSymmetry(unittest.TestCase):
+    def test_canonicalize(self):
+        state = State().place_disk((2, 4)).place_disk((2, 3))
+        canonical_state, transform = symmetry.canonicalize(state)
+
+        for image_transform in range(symmetry.NUM_TRANSFORMS):
+            image = State.from_bitboards(symmetry.transform_bits(state.black, image_transform),
+                                         symmetry.transform_bits(state.white, image_transform))
+            self.assertEqual(symmetry.canonical_key(state), symmetry.canonical_key(image))
+            self.assertEqual(canonical_state, symmetry.canonicalize(image)[0])
+
+        self.assertEqual(sorted(symmetry.transform_action(action, transform) for action in state.valid_moves()),
+                         canonical_state.valid_moves())
+        for action in canonical_state.valid_moves():
+            self.assertIn(symmetry.transform_action(action, symmetry.INVERSE[transform]), state.valid_moves())
+
 # Testing class for Reversi stability agent
 class TestStabilityAgent(unittest.TestCase):
     def test_evaluate(self):
@@ -56,5 +831,6 @@ class TestStabilityAgent(unittest.TestCase):
                        [1, 1, 1, 0, 2, 0, 1, 1],
                        [1, 1, 1, 2, 1, 1, 1, 1]])
 
-        self.assertEqual(16, agent.evaluate(state))
+        # Besides the edges, black's disks in the corners of the left side and white's in the top right corner
+        self.assertEqual(23 - 9, agent.evaluate(state))
         
\ No newline at end of file
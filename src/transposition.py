@@ -0,0 +1,88 @@
+from typing import Dict, NamedTuple, Optional
+
+from model import Coordinate
+
+# Bound types describing how a stored score relates to the true minimax value
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+
+# A single transposition table entry
+class Entry(NamedTuple):
+    key: int
+    depth: int
+    bound: int
+    move: Optional[Coordinate]
+    score: float
+    generation: int
+
+
+# A fixed-size hash table of previously searched positions keyed by Zobrist hash
+# When two positions map to the same slot, the deeper search is kept unless the stored entry is
+# left over from an earlier search, so the table can be kept for a whole game
+class TranspositionTable:
+    # Approximate number of bytes used by one stored entry, including the slot in the table
+    ENTRY_BYTES = 200
+
+    # Creates a new table using at most roughly the given number of megabytes
+    def __init__(self, max_memory_mb: float = 16) -> None:
+        self.size = max(1, int(max_memory_mb * 1024 * 1024) // TranspositionTable.ENTRY_BYTES)
+        self.entries = [None] * self.size
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    # Marks the start of a new search so entries from earlier searches can be replaced
+    def new_search(self) -> None:
+        self.generation += 1
+
+    # Returns the entry stored for the given hash, or None if there is none
+    def lookup(self, key: int) -> Optional[Entry]:
+        entry = self.entries[key % self.size]
+
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        return None
+
+    # Stores the result of searching the position with the given hash to the given depth
+    def store(self, key: int, depth: int, bound: int, move: Optional[Coordinate], score: float) -> None:
+        index = key % self.size
+        entry = self.entries[index]
+
+        if entry is not None and entry.key != key and entry.generation == self.generation and entry.depth > depth:
+            return
+
+        self.entries[index] = Entry(key, depth, bound, move, score, self.generation)
+        self.stores += 1
+
+    # Removes every entry and resets the counters
+    def clear(self) -> None:
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    # Returns the fraction of lookups that found an entry
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    # Returns the table counters for reporting
+    def stats(self) -> Dict[str, float]:
+        return {
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'hit_rate': self.hit_rate(),
+        }
+
+    def __str__(self) -> str:
+        return f"{self.size} entries, {self.hits} hits, {self.misses} misses ({round(self.hit_rate() * 100, 1)}% hit rate)"
@@ -0,0 +1,45 @@
+import random
+from typing import List
+
+import bitboard
+
+# Zobrist hashing for Reversi positions
+# The keys are generated from a fixed seed so hashes agree between processes and runs
+SEED = 4100
+
+_random = random.Random(SEED)
+
+# Random 64-bit keys for a black or white disk on each cell, indexed by bitboard cell index
+BLACK_KEYS: List[int] = [_random.getrandbits(64) for _ in range(64)]
+WHITE_KEYS: List[int] = [_random.getrandbits(64) for _ in range(64)]
+
+# Keys that turn a black disk into a white disk (or back) on each cell
+FLIP_KEYS: List[int] = [black_key ^ white_key for black_key, white_key in zip(BLACK_KEYS, WHITE_KEYS)]
+
+# Key included in the hash when white is to move
+SIDE_KEY: int = _random.getrandbits(64)
+
+
+# Computes the hash of a position and player to move from scratch
+def hash_bitboards(black: int, white: int, black_to_move: bool = True) -> int:
+    key = 0 if black_to_move else SIDE_KEY
+
+    for index in bitboard.iterate_bits(black):
+        key ^= BLACK_KEYS[index]
+    for index in bitboard.iterate_bits(white):
+        key ^= WHITE_KEYS[index]
+
+    return key
+
+
+# Returns the change in hash caused by placing a disk on the move bit and flipping the given disks
+def hash_move(move: int, flips: int, black_to_move: bool) -> int:
+    index = move.bit_length() - 1
+    key = BLACK_KEYS[index] if black_to_move else WHITE_KEYS[index]
+
+    while flips:
+        lowest = flips & -flips
+        key ^= FLIP_KEYS[lowest.bit_length() - 1]
+        flips ^= lowest
+
+    return key